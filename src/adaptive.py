@@ -0,0 +1,136 @@
+from typing import List, Sequence, Tuple, Union
+
+MAX_STRIDE = 4
+# The quality is raised again only if the frame time is well within the
+# budget, a level barely meeting it would otherwise be left right away
+UPGRADE_MARGIN = 0.6
+# Number of windows after which the cost measured at a level is outdated
+COST_TTL = 20
+
+
+class QualityController:
+    """
+    Picks the batch size, the input size of the model and the sampling
+    stride meeting a frame-time budget, based on the measured latency of the
+    detector.
+
+    The levels are ordered from the best to the cheapest. Larger batches
+    come first, as they cost no accuracy, then smaller input sizes and
+    finally sparser sampling. The level moves by a single step after every
+    window of the game, so all frames of a window are detected the same way
+    and the window and the vote threshold keep counting the same sampled
+    frames.
+    """
+
+    def __init__(
+        self,
+        budget: float,
+        img_sizes: Sequence[int],
+        batch_sizes: Sequence[int],
+        max_stride: int = MAX_STRIDE,
+    ) -> None:
+        """
+        :param budget: Detection time per frame of the video in seconds.
+        :param img_sizes: Input sizes supported by the detector, largest first.
+        :param batch_sizes: Batch sizes to choose from, in increasing order.
+        """
+        self._budget: float = budget
+
+        # (batch size, input size, stride) of every level
+        self._levels: List[Tuple[int, int, int]] = [
+            (batch_size, img_sizes[0], 1) for batch_size in batch_sizes
+        ]
+        self._levels += [(batch_sizes[-1], size, 1) for size in img_sizes[1:]]
+        self._levels += [
+            (batch_sizes[-1], img_sizes[-1], stride)
+            for stride in range(2, max_stride + 1)
+        ]
+
+        self._level: int = 0
+        self._seconds: float = 0.0
+        self._no_windows: int = 0
+        self._last_cost: float = 0.0
+        # Last cost measured at every level and the window it was measured in
+        self._costs: List[Union[Tuple[float, int], None]] = [None] * len(
+            self._levels
+        )
+
+    def reset(self) -> None:
+        self._level = 0
+        self._seconds = 0.0
+        self._no_windows = 0
+        self._last_cost = 0.0
+        self._costs = [None] * len(self._levels)
+
+    def observe(self, seconds: float) -> None:
+        """
+        Adds the latency of a detector call made in the current window.
+        """
+        self._seconds += seconds
+
+    def update(self, no_frames: int) -> bool:
+        """
+        Closes the window and moves to the neighbouring level if the frame
+        time of the window is outside of the budget.
+
+        :param no_frames: Number of sampled frames in the window.
+        :return: True if the level has changed.
+        """
+        cost = self._seconds / (no_frames * self.get_stride())
+        self._seconds = 0.0
+        self._no_windows += 1
+        self._last_cost = cost
+        self._costs[self._level] = (cost, self._no_windows)
+
+        level = self._level
+        if cost > self._budget:
+            level = min(level + 1, len(self._levels) - 1)
+        elif cost < self._budget * UPGRADE_MARGIN and level > 0:
+            # A better level known to miss the budget is not tried again
+            # until its cost is outdated
+            known = self._costs[level - 1]
+            if (
+                known is None
+                or known[0] <= self._budget
+                or self._no_windows - known[1] > COST_TTL
+            ):
+                level -= 1
+
+        changed = level != self._level
+        self._level = level
+
+        return changed
+
+    def get_budget(self) -> float:
+        return self._budget
+
+    def get_level(self) -> int:
+        return self._level
+
+    def get_no_levels(self) -> int:
+        return len(self._levels)
+
+    def get_cost(self) -> float:
+        """
+        :return: Last measured detection time per frame of the video.
+        """
+        return self._last_cost
+
+    def get_batch_size(self) -> int:
+        return self._levels[self._level][0]
+
+    def get_img_size(self) -> int:
+        return self._levels[self._level][1]
+
+    def get_stride(self) -> int:
+        return self._levels[self._level][2]
+
+    def get_max_batch_size(self) -> int:
+        return max(level[0] for level in self._levels)
+
+
+def divisors(number: int) -> List[int]:
+    """
+    :return: Divisors of the number in increasing order.
+    """
+    return [ind for ind in range(1, number + 1) if number % ind == 0]
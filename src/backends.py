@@ -0,0 +1,372 @@
+import json
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+from config import ONNX, REPO, TORCH, TORCHSCRIPT
+from detections import DETECTION_COLUMNS, DETECTIONS_PER_FRAME, empty_detections
+
+CUSTOM_MODEL = "custom"
+
+SUFFIXES = {".pt": TORCH, ".torchscript": TORCHSCRIPT, ".onnx": ONNX}
+
+# Key of the exported metadata holding the card names and the input size
+METADATA = "config.txt"
+
+IMG_SIZE = 640
+# Input sizes the models with a variable input size can be switched to,
+# multiples of the largest stride of the network
+IMG_SIZES = [640, 512, 416, 320]
+PAD_COLOR = 114
+# Padded frames kept for reuse, the shape of the frames changes with the
+# table area they are cropped to
+PADDED_CACHE_SIZE = 8
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.45
+MAX_WH = 7680
+
+
+def backend_for(weights_path: Path) -> str:
+    """
+    :return: Name of the backend able to load the given weights file.
+    """
+    suffix = Path(weights_path).suffix
+    if suffix not in SUFFIXES:
+        raise ValueError(f"Unknown weights format: {suffix}")
+
+    return SUFFIXES[suffix]
+
+
+def letterbox(
+    frame: np.ndarray, size: int, out: Union[np.ndarray, None] = None
+) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """
+    Resizes the frame to fit a size x size square keeping its aspect ratio
+    and pads the rest, the same way YOLOv5 does.
+
+    :param out: Padded frame returned by a previous call for a frame of the
+        same shape, only the frame itself is written into it.
+    :return: The padded frame, the resize ratio and the (x, y) padding.
+    """
+    import cv2
+
+    height, width = frame.shape[:2]
+    ratio = min(size / height, size / width)
+    new_width, new_height = round(width * ratio), round(height * ratio)
+    if (new_width, new_height) != (width, height):
+        frame = cv2.resize(
+            frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR
+        )
+
+    pad_x, pad_y = (size - new_width) // 2, (size - new_height) // 2
+    padded = out
+    if padded is None:
+        padded = np.full((size, size, 3), PAD_COLOR, dtype=np.uint8)
+    padded[pad_y : pad_y + new_height, pad_x : pad_x + new_width] = frame
+
+    return padded, ratio, (pad_x, pad_y)
+
+
+def _nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        ind = order[0]
+        keep.append(ind)
+
+        xmin = np.maximum(boxes[ind, 0], boxes[order[1:], 0])
+        ymin = np.maximum(boxes[ind, 1], boxes[order[1:], 1])
+        xmax = np.minimum(boxes[ind, 2], boxes[order[1:], 2])
+        ymax = np.minimum(boxes[ind, 3], boxes[order[1:], 3])
+        inter = np.clip(xmax - xmin, 0, None) * np.clip(ymax - ymin, 0, None)
+        iou = inter / (areas[ind] + areas[order[1:]] - inter)
+
+        order = order[1:][iou <= iou_threshold]
+
+    return np.array(keep, dtype=np.int64)
+
+
+def postprocess(
+    prediction: np.ndarray,
+    conf_threshold: float = CONF_THRESHOLD,
+    iou_threshold: float = IOU_THRESHOLD,
+    max_det: int = DETECTIONS_PER_FRAME,
+) -> np.ndarray:
+    """
+    Filters the raw output of a single image and runs class-aware NMS.
+
+    :param prediction: Array of shape (N, 5 + classes) with xywh boxes,
+        objectness and class scores.
+    :return: Array of shape (M, 6) with xyxy boxes, confidences and class ids.
+    """
+    prediction = prediction[prediction[:, 4] > conf_threshold]
+    if len(prediction) == 0:
+        return empty_detections()
+
+    class_scores = prediction[:, 5:] * prediction[:, 4:5]
+    class_ids = class_scores.argmax(axis=1)
+    confidences = class_scores[np.arange(len(class_ids)), class_ids]
+
+    mask = confidences > conf_threshold
+    prediction, class_ids, confidences = (
+        prediction[mask],
+        class_ids[mask],
+        confidences[mask],
+    )
+    if len(prediction) == 0:
+        return empty_detections()
+
+    boxes = np.empty((len(prediction), 4), dtype=np.float32)
+    boxes[:, :2] = prediction[:, :2] - prediction[:, 2:4] / 2
+    boxes[:, 2:] = prediction[:, :2] + prediction[:, 2:4] / 2
+
+    # Offsetting the boxes by class keeps NMS from merging different cards
+    keep = _nms(boxes + class_ids[:, None] * MAX_WH, confidences, iou_threshold)
+    keep = keep[:max_det]
+
+    detections = np.empty((len(keep), DETECTION_COLUMNS), dtype=np.float32)
+    detections[:, :4] = boxes[keep]
+    detections[:, 4] = confidences[keep]
+    detections[:, 5] = class_ids[keep]
+
+    return detections
+
+
+class Backend:
+    """
+    Runs the card detection model on batches of BGR frames, as decoded by
+    OpenCV.
+    """
+
+    def get_names(self) -> List[str]:
+        raise NotImplementedError
+
+    def get_img_size(self) -> int:
+        return self._img_size
+
+    def get_img_sizes(self) -> List[int]:
+        """
+        :return: Input sizes the model can run at, largest first.
+        """
+        return [self._img_size]
+
+    def set_img_size(self, img_size: int) -> None:
+        if img_size not in self.get_img_sizes():
+            raise ValueError(f"Unsupported input size: {img_size}")
+
+        self._img_size = img_size
+
+    def infer(self, frames: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        :param frames: BGR frames to detect cards in.
+        :return: Array of shape (N, 6) with the xyxy boxes, confidences and
+            class ids of the detected cards for each frame.
+        """
+        raise NotImplementedError
+
+
+class TorchBackend(Backend):
+    """
+    Eager PyTorch model loaded through the YOLOv5 hub entry point, either
+    from GitHub or, for offline use, from a local YOLOv5 checkout.
+    """
+
+    def __init__(
+        self,
+        weights_path: Path,
+        repo: str = REPO,
+        max_det: int = DETECTIONS_PER_FRAME,
+        threads: int = 0,
+    ) -> None:
+        import torch
+
+        if threads > 0:
+            torch.set_num_threads(threads)
+
+        source = "local" if Path(repo).is_dir() else "github"
+        self.model = torch.hub.load(
+            repo, CUSTOM_MODEL, path=str(weights_path), source=source
+        )
+        self.model.max_det = max_det
+        self._img_size: int = IMG_SIZE
+        self._names: List[str] = [
+            self.model.names[ind] for ind in range(len(self.model.names))
+        ]
+
+    def get_names(self) -> List[str]:
+        return self._names
+
+    def get_img_sizes(self) -> List[int]:
+        # AutoShape letterboxes the frames to any multiple of the stride
+        return IMG_SIZES
+
+    def infer(self, frames: List[np.ndarray]) -> List[np.ndarray]:
+        # AutoShape expects RGB, reversing the channels is only a view
+        rgb_frames = [frame[..., ::-1] for frame in frames]
+        predictions = self.model(rgb_frames, size=self._img_size).xyxy
+        return [pred.cpu().numpy() for pred in predictions]
+
+
+class _ExportedBackend(Backend):
+    """
+    Shared pre- and postprocessing of the exported models, which contain
+    only the network itself.
+    """
+
+    def __init__(
+        self,
+        names: List[str],
+        img_size: int,
+        max_det: int = DETECTIONS_PER_FRAME,
+        dynamic: bool = False,
+    ) -> None:
+        """
+        :param dynamic: The model was exported with a variable input size.
+        """
+        self._names: List[str] = names
+        self._img_size: int = img_size
+        self._img_sizes: List[int] = [img_size]
+        if dynamic:
+            self._img_sizes += [size for size in IMG_SIZES if size < img_size]
+        self._max_det: int = max_det
+
+        # Input tensor and padded frames reused by the following batches
+        self._images: np.ndarray = np.empty((0, 3, img_size, img_size), np.float32)
+        self._padded: Dict[Tuple[int, ...], np.ndarray] = {}
+
+    def get_names(self) -> List[str]:
+        return self._names
+
+    def get_img_sizes(self) -> List[int]:
+        return self._img_sizes
+
+    def _forward(self, images: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def infer(self, frames: List[np.ndarray]) -> List[np.ndarray]:
+        if len(frames) == 0:
+            return []
+
+        if (
+            len(self._images) < len(frames)
+            or self._images.shape[2] != self._img_size
+        ):
+            self._images = np.empty(
+                (len(frames), 3, self._img_size, self._img_size), dtype=np.float32
+            )
+        images = self._images[: len(frames)]
+
+        scales = []
+        for ind, frame in enumerate(frames):
+            key = (*frame.shape, self._img_size)
+            if key not in self._padded and len(self._padded) >= PADDED_CACHE_SIZE:
+                self._padded.clear()
+            padded, ratio, pad = letterbox(frame, self._img_size, self._padded.get(key))
+            self._padded[key] = padded
+            # BGR to RGB, HWC to CHW and the scaling in a single pass
+            np.multiply(padded[..., ::-1].transpose(2, 0, 1), 1 / 255, out=images[ind])
+            scales.append((ratio, pad, frame.shape[:2]))
+
+        detections = []
+        for prediction, (ratio, (pad_x, pad_y), (height, width)) in zip(
+            self._forward(images), scales
+        ):
+            dets = postprocess(prediction, max_det=self._max_det)
+            dets[:, [0, 2]] = ((dets[:, [0, 2]] - pad_x) / ratio).clip(0, width)
+            dets[:, [1, 3]] = ((dets[:, [1, 3]] - pad_y) / ratio).clip(0, height)
+            detections.append(dets)
+
+        return detections
+
+
+class TorchScriptBackend(_ExportedBackend):
+    def __init__(
+        self,
+        weights_path: Path,
+        max_det: int = DETECTIONS_PER_FRAME,
+        threads: int = 0,
+    ) -> None:
+        import torch
+
+        if threads > 0:
+            torch.set_num_threads(threads)
+
+        extra_files = {METADATA: ""}
+        self.model = torch.jit.load(
+            str(weights_path), map_location="cpu", _extra_files=extra_files
+        )
+        self.model.eval()
+        metadata = json.loads(extra_files[METADATA])
+        super().__init__(metadata["names"], metadata["img_size"], max_det)
+
+    def _forward(self, images: np.ndarray) -> np.ndarray:
+        import torch
+
+        # The traced model has a fixed batch size of one
+        with torch.no_grad():
+            return np.concatenate(
+                [
+                    self.model(torch.from_numpy(image[None]))[0].numpy()
+                    for image in images
+                ]
+            )
+
+
+class OnnxBackend(_ExportedBackend):
+    def __init__(
+        self,
+        weights_path: Path,
+        max_det: int = DETECTIONS_PER_FRAME,
+        threads: int = 0,
+    ) -> None:
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            str(weights_path), options, providers=["CPUExecutionProvider"]
+        )
+        self._input = self.session.get_inputs()[0].name
+
+        metadata = json.loads(
+            self.session.get_modelmeta().custom_metadata_map[METADATA]
+        )
+        super().__init__(
+            metadata["names"],
+            metadata["img_size"],
+            max_det,
+            metadata.get("dynamic", False),
+        )
+
+    def _forward(self, images: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self._input: images})[0]
+
+
+def load_backend(
+    weights_path: Path,
+    backend: Union[str, None] = None,
+    repo: str = REPO,
+    max_det: int = DETECTIONS_PER_FRAME,
+    threads: int = 0,
+) -> Backend:
+    """
+    Loads the model with the given backend, the backend is picked based on
+    the suffix of the weights file if not given.
+
+    :param threads: Number of threads used by the inference, 0 leaves the
+        default of the backend.
+    """
+    if backend is None:
+        backend = backend_for(weights_path)
+
+    if backend == TORCH:
+        return TorchBackend(weights_path, repo, max_det, threads)
+    elif backend == TORCHSCRIPT:
+        return TorchScriptBackend(weights_path, max_det, threads)
+    elif backend == ONNX:
+        return OnnxBackend(weights_path, max_det, threads)
+
+    raise ValueError(f"Unknown backend: {backend}")
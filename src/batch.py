@@ -0,0 +1,337 @@
+import json
+import multiprocessing
+import os
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+# The spawned workers import this module again, heavy modules are loaded
+# only by the workers processing the videos
+from config import (
+    BACKENDS,
+    MERGE_FRAMES,
+    MIN_CONFIDENCE,
+    MOTION_THRESHOLD,
+    REPO,
+    SAMPLE_EVERY,
+    SOCKET,
+    THRESHOLD,
+)
+
+VIDEO_SUFFIXES = {".m4v", ".mp4", ".avi", ".mov", ".mkv"}
+
+# Per-process state of the pool workers, the detector is loaded only once
+# for all videos processed by the worker
+_worker: Dict[str, Any] = {}
+
+
+def find_videos(source: Path) -> List[Path]:
+    """
+    :param source: Directory with the videos or a manifest file listing one
+        video per line, relative paths are resolved against the manifest.
+    :return: Paths of the videos to process.
+    """
+    if source.is_dir():
+        return sorted(
+            path for path in source.iterdir() if path.suffix.lower() in VIDEO_SUFFIXES
+        )
+
+    with open(source) as infile:
+        lines = [line.strip() for line in infile]
+
+    return [
+        (source.parent / line).resolve()
+        for line in lines
+        if line and not line.startswith("#")
+    ]
+
+
+def _init_worker(weights_path: Path, options: Dict[str, Any]) -> None:
+    _worker["options"] = options
+    _worker["weights_path"] = weights_path
+
+    # The workers share the model of the detection server if there is one
+    if options["server"] is not None:
+        from server import RemoteDetector
+
+        _worker["detector"] = RemoteDetector(options["server"])
+        return
+
+    from detector import Detector
+
+    _worker["detector"] = Detector(
+        weights_path, options["backend"], options["repo"], options["threads"]
+    )
+
+
+def _process_video(source_path: Path) -> Dict[str, Any]:
+    from controller import Controller
+    from motion import MotionGate
+
+    options = _worker["options"]
+    result = {"source": str(source_path), "winner": None, "scores": None}
+
+    start = time.perf_counter()
+    try:
+        motion_gate = None
+        if options["motion_threshold"] is not None:
+            motion_gate = MotionGate(options["motion_threshold"])
+
+        controller = Controller(
+            source_path,
+            _worker["weights_path"],
+            options["verbose"],
+            no_show=True,
+            batch_size=options["batch_size"],
+            motion_gate=motion_gate,
+            cache_dir=options["cache_dir"],
+            merge_frames=options["merge_frames"],
+            threshold=options["threshold"],
+            min_confidence=options["min_confidence"],
+            sample_every=options["sample_every"],
+            target_fps=options["target_fps"],
+            frame_budget=options["frame_budget"],
+            detector=_worker["detector"],
+        )
+        winner = controller.run()
+
+        result["winner"] = None if winner is None else winner.get_id()
+        result["scores"] = [
+            player.get_total_score() for player in controller.game.players
+        ]
+        result["frames"] = controller.get_no_frames()
+        result["stride"] = controller.get_stride()
+    # Controller exits the process on game errors, the worker has to survive
+    except (Exception, SystemExit) as e:
+        result["error"] = repr(e)
+
+    result["seconds"] = time.perf_counter() - start
+    if result.get("frames"):
+        result["fps"] = result["frames"] / result["seconds"]
+
+    return result
+
+
+def process_videos(
+    videos: List[Path],
+    weights_path: Path,
+    options: Dict[str, Any],
+    workers: int,
+) -> List[Dict[str, Any]]:
+    """
+    Runs a Controller for every video on a pool of worker processes.
+
+    :return: Result of every video, in the order of the given videos.
+    """
+    # Spawned workers do not inherit the torch and OpenCV thread pools
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(
+        workers, initializer=_init_worker, initargs=(weights_path, options)
+    ) as pool:
+        # Videos are handed out one by one, as their lengths differ a lot
+        return pool.map(_process_video, videos, chunksize=1)
+
+
+def create_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        description="Detects events in many games of russian schnapsen at once."
+    )
+
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        required=True,
+        help="Directory with the videos or a manifest listing one video per line.",
+    )
+    parser.add_argument(
+        "-w", "--weights", required=True, help="Path to yolo pre-trained weights",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="summary.json",
+        help="Summary file with the results of all videos.",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Inference threads per worker, cores are split evenly by default.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=None,
+        help="Inference backend, picked by the weights file suffix by default.",
+    )
+    parser.add_argument(
+        "--repo",
+        default=REPO,
+        help="YOLOv5 hub repository or path to its local checkout (torch backend).",
+    )
+    parser.add_argument(
+        "--server",
+        type=str,
+        nargs="?",
+        const=SOCKET,
+        default=None,
+        help="Detect the cards in a running detection server (see server.py) "
+        f"instead of loading the model (default socket: {SOCKET}).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        nargs="?",
+        const=MERGE_FRAMES,
+        default=0,
+        help=f"Detect cards in batches of frames (default batch: {MERGE_FRAMES}).",
+    )
+    parser.add_argument(
+        "--motion-threshold",
+        type=float,
+        nargs="?",
+        const=MOTION_THRESHOLD,
+        default=None,
+        help="Skip detection on frames with less motion than the threshold "
+        f"(default threshold: {MOTION_THRESHOLD}).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Directory to store the detections of the videos in.",
+    )
+    parser.add_argument(
+        "--sample-every",
+        type=int,
+        default=SAMPLE_EVERY,
+        help="Detect cards in every Nth frame only, the rest is never decoded.",
+    )
+    parser.add_argument(
+        "--target-fps",
+        type=float,
+        default=None,
+        help="Sample the frames of the video down to the given frame rate.",
+    )
+    parser.add_argument(
+        "--frame-budget",
+        type=float,
+        default=None,
+        help="Detection time per video frame in seconds, the batch size, input "
+        "size and frame sampling are adjusted to meet it.",
+    )
+    parser.add_argument(
+        "--merge-frames",
+        type=int,
+        default=MERGE_FRAMES,
+        help="Number of sampled frames merged into a single game step.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=int,
+        default=THRESHOLD,
+        help="Number of merged frames a new card has to be detected in.",
+    )
+    parser.add_argument(
+        "--min-confidence",
+        type=float,
+        default=MIN_CONFIDENCE,
+        help="Detections with lower confidence are not counted.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        choices=["silent", "info", "debug"],
+        help="Prints debug information.",
+        default="silent",
+    )
+
+    return parser
+
+
+if __name__ == "__main__":
+    parser = create_parser()
+    args = parser.parse_args()
+
+    source = Path(args.input).resolve()
+    if not source.exists():
+        raise FileNotFoundError("Input path invalid, file not found")
+
+    weights_path = Path(args.weights).resolve()
+    if not weights_path.exists():
+        raise FileNotFoundError("Weigths path invalid, file not found")
+
+    if args.workers < 1:
+        raise ValueError("Number of workers has to be a positive number")
+
+    if args.merge_frames < 1:
+        raise ValueError("Number of merged frames has to be a positive number")
+
+    if args.sample_every < 1:
+        raise ValueError("Sampling interval has to be a positive number")
+
+    if args.target_fps is not None and args.target_fps <= 0:
+        raise ValueError("Target frame rate has to be a positive number")
+
+    if args.batch_size < 0:
+        raise ValueError("Batch size cannot be negative")
+
+    if args.frame_budget is not None:
+        if args.frame_budget <= 0:
+            raise ValueError("Frame budget has to be a positive number")
+        if args.sample_every != SAMPLE_EVERY or args.target_fps is not None:
+            raise ValueError("Frame budget adjusts the frame sampling on its own")
+        if args.cache_dir is not None:
+            raise ValueError("Frame budget cannot be combined with the cache")
+
+    videos = find_videos(source)
+    workers = min(args.workers, max(len(videos), 1))
+    threads: Union[int, None] = args.threads
+    if threads is None:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+
+    options = {
+        "backend": args.backend,
+        "repo": args.repo,
+        "threads": threads,
+        "server": args.server,
+        "verbose": args.verbose,
+        "batch_size": args.batch_size,
+        "motion_threshold": args.motion_threshold,
+        "cache_dir": None if args.cache_dir is None else Path(args.cache_dir),
+        "merge_frames": args.merge_frames,
+        "threshold": args.threshold,
+        "min_confidence": args.min_confidence,
+        "sample_every": args.sample_every,
+        "target_fps": args.target_fps,
+        "frame_budget": args.frame_budget,
+    }
+
+    start = time.perf_counter()
+    results = process_videos(videos, weights_path, options, workers)
+    summary = {
+        "weights": str(weights_path),
+        "workers": workers,
+        "threads": threads,
+        "seconds": time.perf_counter() - start,
+        "videos": results,
+    }
+
+    with open(args.output, "w") as outfile:
+        json.dump(summary, outfile, indent=4)
+
+    failed = sum("error" in result for result in results)
+    print(
+        f"Processed {len(results)} videos ({failed} failed) "
+        f"in {summary['seconds']:.1f}s"
+    )
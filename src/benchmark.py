@@ -0,0 +1,563 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+from config import BACKENDS, REPO
+from deck import CARD_NAMES, SUITS
+from detections import DETECTIONS_PER_FRAME, DetectionBuffer
+from events import Event
+from game import Game
+from rules import resolve_tricks
+from state import State
+from window import MERGE_FRAMES
+
+SUITES = ["game", "detector", "e2e"]
+BATCH_SIZES = [1, 2, 4, 8]
+REPEATS = 5
+WARMUP = 2
+# Number of deals played in the synthetic game
+NO_DEALS = 12
+# Events of a synthetic deal: 24 cards dealt, 3 taken from the stock, the
+# bid, 25 cards played, the marriage, 8 tricks and 3 stage changes
+EVENTS_PER_DEAL = 65
+# Number of random tricks resolved at once by the rules engine
+NO_TRICKS = 100000
+# Relative slowdown of a result against the baseline reported as a regression
+TOLERANCE = 0.1
+# Size and length of the generated clip of the end-to-end benchmark
+CLIP_SIZE = (1280, 720)
+CLIP_FRAMES = 300
+
+CARD_BOX = [100.0, 100.0, 220.0, 280.0]
+
+Results = Dict[str, Dict[str, Any]]
+
+
+def _result(value: float, unit: str, higher_is_better: bool) -> Dict[str, Any]:
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def _window(
+    cards: List[str], merge_frames: int, rng: random.Random
+) -> List[np.ndarray]:
+    """
+    :return: Detections of the frames of a window showing the cards, with a
+        one-off false detection in one of the frames.
+    """
+    frames = []
+    for ind in range(merge_frames):
+        rows = [[*CARD_BOX, 0.9, CARD_NAMES.index(card)] for card in cards]
+        if cards and ind == merge_frames // 2:
+            rows.append([*CARD_BOX, 0.5, rng.randrange(len(CARD_NAMES))])
+        frames.append(np.array(rows, dtype=np.float32).reshape(-1, 6))
+
+    return frames
+
+
+def synthetic_deal(merge_frames: int, rng: random.Random) -> List[np.ndarray]:
+    """
+    Detections of a full 24-card deal followed by the bidding, the stock and
+    eight tricks of three cards, the first trick opens with a marriage whose
+    king is played again later.
+
+    :return: Detections of every frame, the classes are indices of
+        deck.CARD_NAMES.
+    """
+    windows: List[List[str]] = []
+
+    deck = CARD_NAMES[:]
+    rng.shuffle(deck)
+    windows += [[card] for card in deck]
+    # Dealing ends, the bidding and the stock follow
+    windows += [[], []]
+    windows += [[card] for card in deck[-3:]]
+    windows.append([])
+
+    cards = deck[:]
+    rng.shuffle(cards)
+    suit = rng.choice(SUITS)
+    queen, king = "Q" + suit, "K" + suit
+    cards.remove(queen)
+    cards.remove(king)
+    # The king of the marriage only scores it and stays in the hand
+    tricks = [[queen, king] + cards[:2]]
+    cards = cards[2:] + [king]
+    tricks += [cards[ind : ind + 3] for ind in range(0, len(cards), 3)]
+
+    for trick in tricks:
+        windows += [trick[: ind + 1] for ind in range(len(trick))]
+        windows.append([])
+
+    return [frame for cards in windows for frame in _window(cards, merge_frames, rng)]
+
+
+def synthetic_game(
+    no_deals: int = NO_DEALS, merge_frames: int = MERGE_FRAMES, seed: int = 0
+) -> List[List[np.ndarray]]:
+    """
+    :return: Detections of the frames of every deal, see synthetic_deal.
+    """
+    rng = random.Random(seed)
+
+    return [synthetic_deal(merge_frames, rng) for _ in range(no_deals)]
+
+
+def benchmark_game(
+    repeats: int = REPEATS, no_deals: int = NO_DEALS, merge_frames: int = MERGE_FRAMES
+) -> Results:
+    """
+    Times the game engine on a synthetic detection stream, without decoding
+    or detecting. The game never returns to dealing, every deal is played
+    by a new game.
+    """
+    deals = synthetic_game(no_deals, merge_frames)
+    no_windows = sum(len(frames) for frames in deals) // merge_frames
+
+    append_times, step_times = [], []
+    for _ in range(repeats):
+        buffer = DetectionBuffer(CARD_NAMES, merge_frames * DETECTIONS_PER_FRAME)
+        append_time, step_time = 0.0, 0.0
+        no_events = 0
+
+        for frames in deals:
+            game = Game("silent")
+            events: List[Event] = []
+            game.subscribe(events.append)
+
+            for start in range(0, len(frames), merge_frames):
+                begin = time.perf_counter()
+                for ind in range(start, start + merge_frames):
+                    buffer.append(frames[ind], ind)
+                middle = time.perf_counter()
+                game.game_frame(buffer)
+                end = time.perf_counter()
+                buffer.clear()
+
+                append_time += middle - begin
+                step_time += end - middle
+
+            no_events += len(events)
+
+        # A stream the game stops following would only time empty windows
+        if no_events != EVENTS_PER_DEAL * no_deals:
+            raise RuntimeError(
+                f"Synthetic game produced {no_events} events instead of "
+                f"{EVENTS_PER_DEAL * no_deals}"
+            )
+
+        append_times.append(append_time)
+        step_times.append(step_time)
+
+    # The entering card of a full window in the middle of a trick
+    game = Game("silent")
+    game.set_state(State.PLAYING)
+    buffer = DetectionBuffer(CARD_NAMES, merge_frames * DETECTIONS_PER_FRAME)
+    for ind, detected_cards in enumerate(
+        _window(CARD_NAMES[:3], merge_frames, random.Random(0))
+    ):
+        buffer.append(detected_cards, ind)
+
+    no_calls = 10000
+    entering_times = []
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        for _ in range(no_calls):
+            game._get_entering_card(buffer)
+        entering_times.append(time.perf_counter() - begin)
+
+    # Bulk resolution of random tricks, as when re-scoring archived games
+    tricks = np.random.default_rng(0).integers(0, len(CARD_NAMES), (NO_TRICKS, 3))
+    resolve_times = []
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        resolve_tricks(tricks)
+        resolve_times.append(time.perf_counter() - begin)
+
+    step_time, append_time = min(step_times), min(append_times)
+
+    return {
+        "game.windows": _result(no_windows, "windows", True),
+        "game.game_frame": _result(step_time / no_windows * 1e6, "us", False),
+        "game.append": _result(
+            append_time / (no_windows * merge_frames) * 1e6, "us", False
+        ),
+        "game.windows_per_second": _result(
+            no_windows / (step_time + append_time), "windows/s", True
+        ),
+        "game.get_entering_card": _result(
+            min(entering_times) / no_calls * 1e6, "us", False
+        ),
+        "rules.tricks_per_second": _result(
+            NO_TRICKS / min(resolve_times), "tricks/s", True
+        ),
+    }
+
+
+def generate_clip(
+    path: Path, no_frames: int = CLIP_FRAMES, size: tuple = CLIP_SIZE, seed: int = 0
+) -> None:
+    """
+    Writes a clip of white cards moving over a green table.
+    """
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    width, height = size
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30, size)
+    if not writer.isOpened():
+        raise RuntimeError("Could not write the benchmark clip")
+
+    table = np.zeros((height, width, 3), dtype=np.uint8)
+    table[...] = (40, 120, 30)
+    positions = rng.uniform(0, 1, (3, 2)) * (width - 120, height - 180)
+    velocities = rng.uniform(-4, 4, (3, 2))
+    for _ in range(no_frames):
+        frame = table.copy()
+        for x, y in positions.astype(int):
+            cv2.rectangle(frame, (x, y), (x + 120, y + 180), (240, 240, 240), -1)
+        writer.write(frame)
+
+        positions = np.clip(positions + velocities, 0, (width - 120, height - 180))
+
+    writer.release()
+
+
+def _load_frames(source: Union[Path, None], no_frames: int) -> List[np.ndarray]:
+    import cv2
+
+    if source is None:
+        width, height = CLIP_SIZE
+        rng = np.random.default_rng(0)
+        return [
+            rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+            for _ in range(no_frames)
+        ]
+
+    cap = cv2.VideoCapture(str(source))
+    frames = []
+    while len(frames) < no_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+
+    if not frames:
+        raise RuntimeError("Could not read frames of the benchmark source")
+
+    # Short videos are looped
+    return [frames[ind % len(frames)] for ind in range(no_frames)]
+
+
+def benchmark_detector(
+    detector: Any,
+    source: Union[Path, None] = None,
+    batch_sizes: List[int] = BATCH_SIZES,
+    img_sizes: Union[List[int], None] = None,
+    repeats: int = REPEATS,
+) -> Results:
+    """
+    Times the detector for every combination of the batch and input sizes.
+
+    :param source: Video to take the frames from, random frames if not given.
+    :param img_sizes: Input sizes to time, all supported by the detector if
+        not given.
+    """
+    frames = _load_frames(source, max(batch_sizes))
+    if img_sizes is None:
+        img_sizes = detector.get_img_sizes()
+
+    results = {}
+    for img_size in img_sizes:
+        detector.set_img_size(img_size)
+        for batch_size in batch_sizes:
+            batch = frames[:batch_size]
+            for _ in range(WARMUP):
+                detector.detect_cards_batch(batch)
+
+            times = []
+            for _ in range(repeats):
+                begin = time.perf_counter()
+                detector.detect_cards_batch(batch)
+                times.append(time.perf_counter() - begin)
+
+            latency = statistics.median(times)
+            name = f"detector.{img_size}.b{batch_size}"
+            results[f"{name}.latency"] = _result(latency * 1e3, "ms", False)
+            results[f"{name}.fps"] = _result(batch_size / latency, "frames/s", True)
+
+    detector.set_img_size(img_sizes[0])
+
+    return results
+
+
+def benchmark_e2e(
+    detector: Any,
+    weights_path: Path,
+    source: Union[Path, None] = None,
+    batch_size: int = 0,
+    pipelined: bool = False,
+    repeats: int = REPEATS,
+) -> Results:
+    """
+    Times the whole processing of a video, from decoding to the game.
+
+    :param source: Video to process, a generated clip if not given.
+    """
+    from controller import Controller
+    from metrics import DECODE, DETECT, GAME
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if source is None:
+            source = Path(tmp_dir) / "clip.avi"
+            generate_clip(source)
+
+        runs = []
+        for _ in range(repeats):
+            controller = Controller(
+                source,
+                weights_path,
+                "silent",
+                True,
+                pipelined=pipelined,
+                batch_size=batch_size,
+                detector=detector,
+            )
+            begin = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                controller.run()
+            runs.append((time.perf_counter() - begin, controller))
+
+    elapsed, controller = min(runs, key=lambda run: run[0])
+    no_frames = controller.get_no_frames()
+    results = {
+        "e2e.frames": _result(no_frames, "frames", True),
+        "e2e.fps": _result(no_frames / elapsed, "frames/s", True),
+    }
+    for stage in (DECODE, DETECT, GAME):
+        histogram = controller.metrics.get_histogram(stage)
+        if histogram is not None:
+            results[f"e2e.{stage}.p50"] = _result(
+                histogram.quantile(0.5) * 1e3, "ms", False
+            )
+
+    return results
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results: Results, baseline: Results, tolerance: float) -> List[str]:
+    """
+    :return: Descriptions of the results worse than the baseline by more
+        than the tolerance, the results missing in either are skipped.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        old, new = baseline[name]["value"], result["value"]
+        if result["higher_is_better"]:
+            regressed = new < old * (1 - tolerance)
+        else:
+            regressed = new > old * (1 + tolerance)
+
+        if regressed:
+            regressions.append(f"{name}: {old:.4g} -> {new:.4g} {result['unit']}")
+
+    return regressions
+
+
+def create_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        description="Benchmarks the game engine, the detector and the whole "
+        "processing of a video."
+    )
+
+    parser.add_argument(
+        "--suites",
+        nargs="+",
+        choices=SUITES,
+        default=SUITES,
+        help="Benchmarks to run, all by default.",
+    )
+    parser.add_argument(
+        "-w",
+        "--weights",
+        required=False,
+        default=None,
+        help="Path to yolo pre-trained weights, needed by the detector and "
+        "e2e benchmarks.",
+    )
+    parser.add_argument(
+        "-s",
+        "--source",
+        required=False,
+        default=None,
+        help="Video to benchmark on, random frames or a generated clip if not "
+        "given.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default=None,
+        help="JSON file to write the results to, printed if not given.",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="JSON results of an earlier run, exits with an error if any "
+        "result is worse by more than the tolerance.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=TOLERANCE,
+        help="Allowed relative slowdown against the baseline.",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=REPEATS,
+        help="Number of timed runs of every benchmark.",
+    )
+    parser.add_argument(
+        "--batch-sizes",
+        type=int,
+        nargs="+",
+        default=BATCH_SIZES,
+        help="Batch sizes of the detector benchmark.",
+    )
+    parser.add_argument(
+        "--img-sizes",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Input sizes of the detector benchmark, all supported by default.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=0,
+        help="Batch size of the e2e benchmark, frames are detected one by one "
+        "if not given.",
+    )
+    parser.add_argument(
+        "--pipelined",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Run the e2e benchmark with decoding, detection and game logic "
+        "in parallel threads.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=None,
+        help="Inference backend, picked by the weights file suffix by default.",
+    )
+    parser.add_argument(
+        "--repo",
+        default=REPO,
+        help="YOLOv5 hub repository or path to its local checkout (torch backend).",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="Number of inference threads, the backend default if not given.",
+    )
+
+    return parser
+
+
+if __name__ == "__main__":
+    parser = create_parser()
+    args = parser.parse_args()
+
+    if args.repeats < 1:
+        raise ValueError("Number of repeats has to be a positive number")
+
+    source_path = None
+    if args.source is not None:
+        source_path = Path(args.source).resolve()
+        if not source_path.exists():
+            raise FileNotFoundError("Source path invalid, file not found")
+
+    detector, weights_path = None, None
+    if "detector" in args.suites or "e2e" in args.suites:
+        if args.weights is None:
+            raise ValueError("Detector and e2e benchmarks need the weights")
+
+        weights_path = Path(args.weights).resolve()
+        if not weights_path.exists():
+            raise FileNotFoundError("Weigths path invalid, file not found")
+
+        from detector import Detector
+
+        detector = Detector(weights_path, args.backend, args.repo, args.threads)
+
+    results: Results = {}
+    if "game" in args.suites:
+        results.update(benchmark_game(args.repeats))
+    if "detector" in args.suites:
+        results.update(
+            benchmark_detector(
+                detector, source_path, args.batch_sizes, args.img_sizes, args.repeats
+            )
+        )
+    if "e2e" in args.suites:
+        results.update(
+            benchmark_e2e(
+                detector,
+                weights_path,
+                source_path,
+                args.batch_size,
+                args.pipelined,
+                args.repeats,
+            )
+        )
+
+    report = {
+        "environment": environment(),
+        "weights": None if weights_path is None else weights_path.name,
+        "source": None if source_path is None else source_path.name,
+        "results": results,
+    }
+    if args.output is not None:
+        with open(args.output, "w") as outfile:
+            json.dump(report, outfile, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+    if args.baseline is not None:
+        with open(args.baseline) as infile:
+            baseline = json.load(infile)["results"]
+
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Union
+
+import numpy as np
+
+from detections import DETECTION_COLUMNS
+
+DETECTIONS_FILE = "detections.bin"
+OFFSETS_FILE = "offsets.npy"
+META_FILE = "meta.json"
+
+CHUNK_SIZE = 1 << 20
+# Number of chunks sampled from the video, hashing a multi-hour recording
+# whole would take longer than the replay itself
+VIDEO_SAMPLES = 16
+
+
+def _file_digest(path: Path, sampled: bool = False) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    size = os.path.getsize(path)
+    digest.update(str(size).encode())
+
+    with open(path, "rb") as infile:
+        if sampled and size > CHUNK_SIZE * VIDEO_SAMPLES:
+            step = (size - CHUNK_SIZE) // (VIDEO_SAMPLES - 1)
+            for ind in range(VIDEO_SAMPLES):
+                infile.seek(ind * step)
+                digest.update(infile.read(CHUNK_SIZE))
+        else:
+            for chunk in iter(lambda: infile.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def detection_settings(*stages: Any) -> Dict[str, Any]:
+    """
+    :param stages: Motion gate, table region and tracker of the run, None for
+        the ones not used.
+    :return: Options of the stages changing the detections, see cache_key.
+    """
+    settings = {}
+    for stage in stages:
+        if stage is not None:
+            settings.update(stage.get_settings())
+
+    return settings
+
+
+def cache_key(
+    source_path: Path,
+    weights_path: Path,
+    stride: int = 1,
+    settings: Union[Dict[str, Any], None] = None,
+) -> str:
+    """
+    :param stride: Number of video frames per detected frame.
+    :param settings: Options of the run changing the detections, see
+        detection_settings.
+    :return: Key identifying the detections of the video made by the weights.
+    """
+    key = f"{_file_digest(source_path, sampled=True)}-{_file_digest(weights_path)}"
+    if stride > 1:
+        key += f"-s{stride}"
+    if settings:
+        digest = hashlib.blake2b(
+            json.dumps(settings, sort_keys=True).encode(), digest_size=4
+        )
+        key += f"-{digest.hexdigest()}"
+
+    return key
+
+
+class DetectionWriter:
+    """
+    Streams per-frame detections to disk.
+
+    The detections of all frames are appended to a single raw float32 file,
+    the offsets of the frames and the metadata are written on close. The
+    metadata file is written last and marks the cache as usable, it is only
+    written once the detections of the whole video have been written.
+    """
+
+    def __init__(self, path: Path, names: Sequence[str]) -> None:
+        self._path: Path = Path(path)
+        self._path.mkdir(parents=True, exist_ok=True)
+        (self._path / META_FILE).unlink(missing_ok=True)
+
+        self._names: List[str] = [str(name) for name in names]
+        self._outfile = open(self._path / DETECTIONS_FILE, "wb")
+        self._offsets: List[int] = [0]
+
+    def write(self, detected_cards: np.ndarray) -> None:
+        """
+        :param detected_cards: Detections of the next frame, see
+            Detector.detect_cards.
+        """
+        self._outfile.write(np.ascontiguousarray(detected_cards, np.float32).data)
+        self._offsets.append(self._offsets[-1] + len(detected_cards))
+
+    def close(self, complete: bool = True) -> None:
+        """
+        :param complete: The detections of every frame of the video have been
+            written, an incomplete cache is never read.
+        """
+        if self._outfile.closed:
+            return
+
+        self._outfile.close()
+        if not complete:
+            return
+
+        np.save(self._path / OFFSETS_FILE, np.array(self._offsets, dtype=np.int64))
+        with open(self._path / META_FILE, "w") as outfile:
+            json.dump(
+                {"names": self._names, "no_frames": len(self._offsets) - 1}, outfile
+            )
+
+    def __enter__(self) -> "DetectionWriter":
+        return self
+
+    def __exit__(self, exc_type, *args) -> None:
+        self.close(complete=exc_type is None)
+
+
+class DetectionReader:
+    """
+    Memory-mapped view of the detections written by DetectionWriter.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path: Path = Path(path)
+        if not DetectionReader.exists(self._path):
+            raise FileNotFoundError(f"No cached detections in {self._path}")
+
+        with open(self._path / META_FILE) as infile:
+            meta = json.load(infile)
+
+        self._names: List[str] = meta["names"]
+        self._offsets: np.ndarray = np.load(self._path / OFFSETS_FILE)
+
+        if self._offsets[-1] == 0:
+            # Memory-mapping an empty file is not possible
+            self._detections = np.empty((0, DETECTION_COLUMNS), dtype=np.float32)
+        else:
+            self._detections = np.memmap(
+                self._path / DETECTIONS_FILE,
+                dtype=np.float32,
+                mode="r",
+                shape=(int(self._offsets[-1]), DETECTION_COLUMNS),
+            )
+
+    @staticmethod
+    def exists(path: Path) -> bool:
+        return (Path(path) / META_FILE).exists()
+
+    def get_names(self) -> List[str]:
+        return self._names
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, frame_index: int) -> np.ndarray:
+        return self._detections[
+            self._offsets[frame_index] : self._offsets[frame_index + 1]
+        ]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for frame_index in range(len(self)):
+            yield self[frame_index]
+
+
+def cache_path(
+    cache_dir: Path,
+    source_path: Path,
+    weights_path: Path,
+    stride: int = 1,
+    settings: Union[Dict[str, Any], None] = None,
+) -> Path:
+    """
+    :return: Directory of the cached detections of the video made by the weights.
+    """
+    return Path(cache_dir) / cache_key(source_path, weights_path, stride, settings)
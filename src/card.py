@@ -1,18 +1,37 @@
+from typing import Dict
+
 from config import scores
+from deck import card_index
 
 
 class Card:
-    def __init__(self, card_class: str) -> None:
-        self._card_class: str = card_class
-        self._value, self._suit = card_class[:-1], card_class[-1]
-        self._score = self._get_points()
+    """
+    Card of the deck. Cards are immutable and interned, Card(name) returns
+    the same instance for every detection of a card.
+    """
+
+    __slots__ = ("_card_class", "_value", "_suit", "_score", "_index")
+    _cards: Dict[str, "Card"] = {}
+
+    def __new__(cls, card_class: str) -> "Card":
+        card = cls._cards.get(card_class)
+        if card is None:
+            card = super().__new__(cls)
+            card._card_class = card_class
+            card._value, card._suit = card_class[:-1], card_class[-1]
+            card._score = scores[card._value]
+            card._index = card_index(card_class)
+            cls._cards[card_class] = card
+
+        return card
+
+    def __reduce__(self):
+        # Unpickled cards are interned as well
+        return Card, (self._card_class,)
 
     def get_name(self):
         return self._card_class
 
-    def _get_points(self):
-        return scores[self._value]
-
     def get_score(self):
         return self._score
 
@@ -22,6 +41,15 @@ class Card:
     def get_suit(self):
         return self._suit
 
+    def get_index(self) -> int:
+        """
+        :return: Index of the card in the deck, see deck.CARD_NAMES.
+        """
+        return self._index
+
+    def get_mask(self) -> int:
+        return 1 << self._index
+
     def is_queen(self):
         return self._value == "Q"
 
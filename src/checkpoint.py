@@ -0,0 +1,69 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Union
+
+from config import CHECKPOINT_INTERVAL
+
+CHECKPOINT_VERSION = 1
+
+
+class Checkpointer:
+    """
+    Periodically saves the state of a run to a JSON file.
+
+    The file is replaced atomically, a run killed while saving leaves the
+    previous checkpoint intact. A checkpoint is a few kilobytes, saving one
+    costs far less than the detection of a single frame.
+    """
+
+    def __init__(
+        self, path: Union[Path, str], interval: float = CHECKPOINT_INTERVAL
+    ) -> None:
+        """
+        :param interval: Minimum number of seconds between two checkpoints.
+        """
+        self._path: Path = Path(path)
+        self._interval: float = interval
+        self._last_saved: float = time.monotonic()
+        self._no_saved: int = 0
+
+    def get_path(self) -> Path:
+        return self._path
+
+    def get_no_saved(self) -> int:
+        return self._no_saved
+
+    def is_due(self) -> bool:
+        return time.monotonic() - self._last_saved >= self._interval
+
+    def save(self, checkpoint: Dict[str, Any]) -> None:
+        """
+        :param checkpoint: JSON-serializable state of the run.
+        """
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w") as outfile:
+            json.dump({"version": CHECKPOINT_VERSION, **checkpoint}, outfile)
+            # The checkpoint has to survive a crash of the whole machine
+            outfile.flush()
+            os.fsync(outfile.fileno())
+
+        os.replace(tmp_path, self._path)
+        self._last_saved = time.monotonic()
+        self._no_saved += 1
+
+    def load(self) -> Union[Dict[str, Any], None]:
+        """
+        :return: The last saved state of the run, None if nothing was saved.
+        """
+        if not self._path.exists():
+            return None
+
+        with open(self._path) as infile:
+            checkpoint = json.load(infile)
+
+        if checkpoint.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version in {self._path}")
+
+        return checkpoint
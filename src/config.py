@@ -1,12 +1,26 @@
-import json
+# Points of the card values and of the marriages of every suit, compiled in
+# so that nothing is read from the working directory
+scores = {"9": 0, "10": 10, "J": 2, "Q": 3, "K": 4, "A": 11}
+trumps = {"H": 100, "D": 80, "C": 60, "S": 40}
 
+# Defaults of the command line options shared by the entry points. This
+# module imports nothing, so the arguments are parsed and checked before
+# numpy, OpenCV or torch are loaded.
+REPO = "ultralytics/yolov5"
 
-CARDS = "cards"
-TRUMPS = "trumps"
+TORCH = "torch"
+TORCHSCRIPT = "torchscript"
+ONNX = "onnx"
+BACKENDS = [TORCH, TORCHSCRIPT, ONNX]
 
-scores = None
-trumps = None
-
-with open("data/card_scores.json") as infile:
-    scores = json.load(infile)
-    scores, trumps = scores[CARDS], scores[TRUMPS]
+SAMPLE_EVERY = 1
+MERGE_FRAMES = 10
+THRESHOLD = 8
+MIN_CONFIDENCE = 0.25
+MOTION_THRESHOLD = 2.0
+# Number of detected frames between two full-frame re-checks of the area
+ROI_INTERVAL = 300
+DETECT_EVERY = 3
+SOCKET = "/tmp/schnapsen-detector.sock"
+# Seconds between two checkpoints of a long recording
+CHECKPOINT_INTERVAL = 60.0
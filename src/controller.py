@@ -1,104 +1,541 @@
 import sys
+import time
+from collections import deque
 from pathlib import Path
+from typing import Deque, Iterator, List, Tuple, Union
 
 import cv2
 import numpy as np
-import pandas as pd
 
+from adaptive import QualityController, divisors
+from backends import REPO
+from cache import DetectionWriter, cache_key, cache_path, detection_settings
+from checkpoint import Checkpointer
+from detections import empty_detections
 from detector import Detector
-from game import Game
+from display import Display
+from frames import FrameReader, SAMPLE_EVERY, sampling_stride
+from game import Game, THRESHOLD
+from live import LiveReader, open_live
+from metrics import (
+    DECODE,
+    DETECT,
+    EVENT_LATENCY,
+    GAME,
+    MOTION,
+    WINDOW_EVENT,
+    Metrics,
+)
+from motion import MotionGate
+from pipeline import Pipeline, QUEUE_SIZE
 from player import Player
+from roi import TableRegion
 from state import State
+from tracker import CardTracker
 from verboser import Verboser
-
-MERGE_FRAMES = 10
+from votes import MIN_CONFIDENCE
+from window import GameWindow, MERGE_FRAMES
 
 
 class Controller:
     def __init__(
-        self, source_path: Path, weights_path: Path, verbose: str, no_show: bool
+        self,
+        source_path: Union[Path, str],
+        weights_path: Path,
+        verbose: str,
+        no_show: bool,
+        pipelined: bool = False,
+        queue_size: int = QUEUE_SIZE,
+        batch_size: int = 0,
+        motion_gate: Union[MotionGate, None] = None,
+        backend: Union[str, None] = None,
+        repo: str = REPO,
+        threads: int = 0,
+        cache_dir: Union[Path, None] = None,
+        merge_frames: int = MERGE_FRAMES,
+        threshold: int = THRESHOLD,
+        min_confidence: float = MIN_CONFIDENCE,
+        detector: Union[Detector, None] = None,
+        metrics: Union[Metrics, None] = None,
+        sample_every: int = SAMPLE_EVERY,
+        target_fps: Union[float, None] = None,
+        live: bool = False,
+        frame_budget: Union[float, None] = None,
+        table_region: Union[TableRegion, None] = None,
+        tracker: Union[CardTracker, None] = None,
+        checkpoint: Union[Checkpointer, None] = None,
+        resume: bool = False,
     ) -> None:
         self._source_path = source_path
+        self._weights_path = weights_path
         self._verbose: Verboser = Verboser(verbose)
         self._no_show = no_show
+        self._pipelined = pipelined
+        self._queue_size = queue_size
+        self._batch_size = batch_size
+        self._motion_gate = motion_gate
+        self._table_region = table_region
+        self._tracker = tracker
+        self._cache_dir = cache_dir
+        self._sample_every = sample_every
+        self._target_fps = target_fps
+        self._live = live
+        self._checkpoint = checkpoint
+        self._resume = resume
+        self._checkpoint_key: Union[str, None] = None
+        self._stride: int = 1
+        self._reader: Union[FrameReader, LiveReader, None] = None
+        self.metrics = Metrics() if metrics is None else metrics
+
+        # Checked before the model is loaded
+        if frame_budget is not None:
+            if pipelined or live:
+                raise ValueError(
+                    "Frame budget cannot be combined with pipelining or live mode"
+                )
+            if sample_every != SAMPLE_EVERY or target_fps is not None:
+                raise ValueError("Frame budget adjusts the frame sampling on its own")
+            # The stride changes during the run, the cache is keyed by a
+            # single one
+            if cache_dir is not None:
+                raise ValueError("Frame budget cannot be combined with the cache")
+        if cache_dir is not None and live:
+            raise ValueError("Live mode cannot be combined with the cache")
+        if checkpoint is not None and live:
+            raise ValueError("Live streams cannot be checkpointed")
+        if resume and checkpoint is None:
+            raise ValueError("Resuming needs a checkpoint")
+        if resume and cache_dir is not None:
+            raise ValueError("The detections of a resumed run cannot be cached")
+
+        # An already loaded detector can be shared by consecutive controllers
+        if detector is None:
+            detector = Detector(weights_path, backend, repo, threads)
+        self.detector = detector
+        self.game = Game(verbose, threshold)
+
+        # Batches of a divisor of the window size end together with the
+        # windows, the quality is changed only in between them
+        self._quality: Union[QualityController, None] = None
+        if frame_budget is not None:
+            self._quality = QualityController(
+                frame_budget, self.detector.get_img_sizes(), divisors(merge_frames)
+            )
 
-        self.detector = Detector(weights_path)
-        self.game = Game(verbose)
+        self._frame_index: int = 0
+        self._window = GameWindow(
+            self.game, self.detector.get_names(), merge_frames, min_confidence
+        )
+        self._cache_writer: Union[DetectionWriter, None] = None
+        self._display: Union[Display, None] = None
+        if not no_show:
+            self._display = Display(self.detector.get_names(), self.metrics)
+        self._last_detections: np.ndarray = empty_detections()
+        self._winner: Union[Player, None] = None
+        # Indices and decoding (or capture) times of the frames not yet
+        # processed by the game
+        self._frame_times: Deque[Tuple[int, float]] = deque()
+        self._window_start: Union[float, None] = None
+        # The whole video has been processed by the last run
+        self._completed: bool = False
 
-    def run(self):
-        font = cv2.FONT_HERSHEY_PLAIN
-        cap = cv2.VideoCapture(str(self._source_path))
+    def get_no_frames(self) -> int:
+        """
+        :return: Number of sampled frames processed in the last run.
+        """
+        return self._frame_index
+
+    def get_stride(self) -> int:
+        return self._stride
+
+    def run(self) -> Union[Player, None]:
+        if self._live:
+            cap = open_live(str(self._source_path))
+        else:
+            cap = cv2.VideoCapture(str(self._source_path))
         if not cap.isOpened():
             raise RuntimeError("Could not open video")
 
-        frame_counter = 0
-        detector_buffer = None
-        while cap.isOpened():
-            ret, frame = cap.read()
-            frame_counter += 1
+        self._window.reset()
+        self._winner = None
+        self._completed = False
+        start = 0
+        if self._checkpoint is not None:
+            self._checkpoint_key = cache_key(self._source_path, self._weights_path)
+            if self._resume:
+                start = self._restore_checkpoint(cap)
 
-            if not ret:
-                break
+        if self._live:
+            # The live reader samples the stream by dropping the frames
+            # captured during the processing
+            self._stride = 1
+            self._reader = LiveReader(cap, self._no_frame_buffers())
+        else:
+            self._stride = sampling_stride(
+                cap.get(cv2.CAP_PROP_FPS), self._sample_every, self._target_fps
+            )
+            self._reader = FrameReader(
+                cap, self._no_frame_buffers(), self._stride, start
+            )
+        if self._quality is not None:
+            self._quality.reset()
+            self._apply_quality()
+        self._frame_index = 0
+        self._last_detections = empty_detections()
+        self._frame_times.clear()
+        self._window_start = None
+        self.metrics.reset()
+        if self._motion_gate is not None:
+            self._motion_gate.reset()
+        if self._table_region is not None:
+            self._table_region.reset()
+        if self._tracker is not None:
+            self._tracker.reset()
 
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if self._cache_dir is not None:
+            self._cache_writer = DetectionWriter(
+                cache_path(
+                    self._cache_dir,
+                    self._source_path,
+                    self._weights_path,
+                    self._stride,
+                    detection_settings(
+                        self._motion_gate, self._table_region, self._tracker
+                    ),
+                ),
+                self.detector.get_names(),
+            )
 
-            detected_cards = self.detector.detect_cards(frame)
+        if self._display is not None:
+            self._display.start()
+        if self._live:
+            self._reader.start()
 
-            if detector_buffer is None:
-                detector_buffer = detected_cards
+        try:
+            if self._pipelined:
+                self._run_pipelined(cap)
             else:
-                detector_buffer = detector_buffer.append(
-                    detected_cards, ignore_index=True
+                self._run_sequential(cap)
+        finally:
+            if self._live:
+                self._reader.stop()
+            cap.release()
+            if self._display is not None:
+                self._display.stop()
+            if self._cache_writer is not None:
+                # Runs stopped before the end of the video leave no usable cache
+                self._cache_writer.close(complete=self._completed)
+                self._cache_writer = None
+            self.metrics.close()
+
+        if self._verbose in (Verboser.INFO, Verboser.DEBUG):
+            if self._stride > 1:
+                self.print_sampling()
+            if self._motion_gate is not None:
+                self.print_skip_rate()
+            if self._table_region is not None:
+                self.print_table_region()
+            if self._live:
+                self.print_latency()
+
+        # TODO: Get points from game
+        if self._winner is not None:
+            self.print_winner(self._winner)
+        else:
+            print("Winner has not been determined")
+
+        return self._winner
+
+    def _restore_checkpoint(self, cap: cv2.VideoCapture) -> int:
+        """
+        Restores the game from the last checkpoint and seeks the video past
+        the frames the game has already processed.
+
+        :return: Index of the first frame to read.
+        """
+        checkpoint = self._checkpoint.load()
+        if checkpoint is None:
+            if self._verbose in (Verboser.INFO, Verboser.DEBUG):
+                print("No checkpoint found, starting from the beginning\n")
+            return 0
+
+        if checkpoint["key"] != self._checkpoint_key:
+            raise ValueError("Checkpoint was taken on another video or weights")
+        if checkpoint["merge_frames"] != self._window.get_merge_frames():
+            raise ValueError("Checkpoint was taken with another window size")
+
+        self.game.load_snapshot(checkpoint["game"])
+        self._winner = self.game.winner
+
+        position = checkpoint["position"]
+        cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != position:
+            raise RuntimeError("Could not seek the video to the checkpoint")
+
+        if self._verbose in (Verboser.INFO, Verboser.DEBUG):
+            print(f"Resuming from frame {position} in {self.game.get_state()} stage\n")
+
+        return position
+
+    def _save_checkpoint(self, frame_position: int) -> None:
+        """
+        :param frame_position: Index of the last frame of the window the game
+            has just processed.
+        """
+        self._checkpoint.save(
+            {
+                "key": self._checkpoint_key,
+                "merge_frames": self._window.get_merge_frames(),
+                # The frames read ahead of the game are detected again
+                "position": frame_position + self._stride,
+                "game": self.game.get_snapshot(),
+            }
+        )
+
+    def _no_frame_buffers(self) -> int:
+        batch_size = max(self._batch_size, 1)
+        if self._quality is not None:
+            batch_size = self._quality.get_max_batch_size()
+        if self._pipelined:
+            # Batches being read, detected and processed and the full queues
+            # between them
+            in_flight = batch_size * (2 * self._queue_size + 3)
+        else:
+            in_flight = batch_size
+
+        # The display may still be copying the frames submitted last
+        return in_flight + 2
+
+    def _read_frames(self, cap: cv2.VideoCapture) -> Iterator[List[np.ndarray]]:
+        """
+        Reads the sampled frames of the video in batches of BGR frames, a
+        batch holds a single frame unless batching is enabled.
+        """
+        frames = []
+        while cap.isOpened():
+            start = time.perf_counter()
+            frame = self._reader.read()
+            decoded = time.perf_counter()
+            if frame is None:
+                break
+
+            frames.append(frame)
+            if self._live:
+                # Waiting for the next frame is not decoding, the capture
+                # runs in its own thread
+                self._frame_times.append(
+                    (self._reader.get_position(), self._reader.get_captured_at())
                 )
+            else:
+                self.metrics.observe(DECODE, decoded - start)
+                self._frame_times.append((self._reader.get_position(), decoded))
 
-            if not self._no_show:
-                # Add labels to detection
-                for det_card in detected_cards.itertuples():
-                    xmin, ymin, xmax, ymax = (
-                        int(det_card.xmin),
-                        int(det_card.ymin),
-                        int(det_card.xmax),
-                        int(det_card.ymax),
-                    )
-
-                    cv2.rectangle(
-                        frame, (xmin, ymin), (xmax, ymax), (0, 128, 0), 2,
-                    )
-                    cv2.putText(
-                        frame,
-                        det_card.name,
-                        (xmin, ymin - 10),
-                        font,
-                        2,
-                        (0, 128, 0),
-                        2,
-                    )
-
-                cv2.imshow("frame", cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
-                if cv2.waitKey(25) & 0xFF == ord("q"):
-                    break
+            # The batch size can change between the batches
+            if len(frames) == max(self._batch_size, 1):
+                yield frames
+                frames = []
+
+        if frames:
+            yield frames
+
+    def _detect(
+        self, frames: List[np.ndarray]
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if self._motion_gate is None:
+            moving = [True] * len(frames)
+        else:
+            start = time.perf_counter()
+            moving = [self._motion_gate.is_moving(frame) for frame in frames]
+            self.metrics.observe(MOTION, time.perf_counter() - start)
+
+        detect = moving
+        if self._tracker is not None:
+            # The tracker follows the cards on the moving frames in between,
+            # the static frames are neither detected nor tracked
+            scheduled = iter(self._tracker.schedule(sum(moving)))
+            detect = [is_moving and next(scheduled) for is_moving in moving]
 
-            if frame_counter % MERGE_FRAMES == 0:
-                try:
-                    winner = self.game.game_frame(detector_buffer)
-                except Exception as e:
-                    print(e)
-                    print("Terminating due to error")
-                    sys.exit(-1)
+        to_detect = [frame for frame, is_detected in zip(frames, detect) if is_detected]
+        inputs = to_detect
+        if self._table_region is not None:
+            crops = [self._table_region.crop(frame) for frame in to_detect]
+            inputs = [crop for crop, _ in crops]
 
-                if winner is not None:
+        if self._batch_size > 0 and inputs:
+            start = time.perf_counter()
+            detections = self.detector.detect_cards_batch(inputs)
+            self._observe_detect(time.perf_counter() - start)
+        else:
+            detections = [self._detect_frame(frame) for frame in inputs]
+
+        if self._table_region is not None:
+            for dets, frame, (_, region) in zip(detections, to_detect, crops):
+                self._table_region.update(dets, region, frame.shape)
+
+        detected_cards = iter(detections)
+
+        batch = []
+        for frame, is_moving, is_detected in zip(frames, moving, detect):
+            # Static frames reuse the detections of the previous frame, they
+            # do not count as misses of the tracks
+            if is_moving and self._tracker is not None:
+                self._last_detections = self._tracker.step(
+                    next(detected_cards) if is_detected else None
+                )
+            elif is_detected:
+                self._last_detections = next(detected_cards)
+
+            batch.append((frame, self._last_detections))
+
+        return batch
+
+    def _detect_frame(self, frame: np.ndarray) -> np.ndarray:
+        start = time.perf_counter()
+        detected_cards = self.detector.detect_cards(frame)
+        self._observe_detect(time.perf_counter() - start)
+
+        return detected_cards
+
+    def _observe_detect(self, seconds: float) -> None:
+        self.metrics.observe(DETECT, seconds)
+        if self._quality is not None:
+            self._quality.observe(seconds)
+
+    def _apply_quality(self) -> None:
+        self._batch_size = self._quality.get_batch_size()
+        self._stride = self._quality.get_stride()
+        self._reader.set_stride(self._stride)
+        self.detector.set_img_size(self._quality.get_img_size())
+
+        if self._verbose == Verboser.DEBUG:
+            print(
+                f"Quality level {self._quality.get_level()}: "
+                f"batch {self._batch_size}, "
+                f"input size {self._quality.get_img_size()}, "
+                f"stride {self._stride} "
+                f"(detection {self._quality.get_cost() * 1000:.1f} ms per frame)"
+            )
+
+    def _process_batch(self, batch: List[Tuple[np.ndarray, np.ndarray]]) -> bool:
+        for frame, detected_cards in batch:
+            if not self._process_frame(frame, detected_cards):
+                return False
+
+        return True
+
+    def _run_sequential(self, cap: cv2.VideoCapture) -> None:
+        for frames in self._read_frames(cap):
+            if not self._process_batch(self._detect(frames)):
+                break
+        else:
+            self._completed = True
+
+    def _run_pipelined(self, cap: cv2.VideoCapture) -> None:
+        """
+        Runs decoding, inference and the game logic as three concurrent
+        stages.
+        """
+        with Pipeline(
+            self._read_frames(cap), [self._detect], self._queue_size
+        ) as pipeline:
+            for batch in pipeline:
+                if not self._process_batch(batch):
                     break
-                else:
-                    frame_counter = 0
-                    detector_buffer = None
+            else:
+                self._completed = True
 
-        cap.release()
-        cv2.destroyAllWindows()
-        # TODO: Get points from game
+    def _process_frame(self, frame: np.ndarray, detected_cards: np.ndarray) -> bool:
+        """
+        Feeds the detections of a single frame to the game.
+
+        :return: False if the processing should stop, True otherwise.
+        """
+        if self._cache_writer is not None:
+            self._cache_writer.write(detected_cards)
+
+        if self._display is not None:
+            if self._display.is_closed():
+                if self._display.get_error() is not None:
+                    raise self._display.get_error()
+                return False
+
+            self._display.submit(frame, detected_cards)
+
+        frame_position, decoded_at = self._frame_times.popleft()
+        if self._winner is not None:
+            # Once the game has ended the rest of the video is only detected
+            # to complete the cache
+            return self._cache_writer is not None
+
+        if self._window_start is None:
+            self._window_start = decoded_at
+
+        no_windows = self._window.get_no_windows()
+        start = time.perf_counter()
+        try:
+            winner = self._window.push(detected_cards, frame_position)
+        except Exception as e:
+            print(e)
+            if self._checkpoint is not None:
+                # Only the windows processed without errors are saved
+                print(f"The game can be resumed from {self._checkpoint.get_path()}")
+            print("Terminating due to error")
+            sys.exit(-1)
+
+        finished = time.perf_counter()
+        self.metrics.observe(GAME, finished - start)
+        if self._window.get_no_windows() != no_windows:
+            self.metrics.observe(WINDOW_EVENT, finished - decoded_at)
+            self.metrics.observe(EVENT_LATENCY, finished - self._window_start)
+            self._window_start = None
+            if self._quality is not None and self._quality.update(
+                self._window.get_merge_frames()
+            ):
+                self._apply_quality()
+            if self._checkpoint is not None and (
+                winner is not None or self._checkpoint.is_due()
+            ):
+                self._save_checkpoint(frame_position)
+        self.metrics.frame_done()
+
+        self._frame_index += 1
         if winner is not None:
-            self.print_winner(winner)
-        else:
-            print("Winner has not been determined")
+            self._winner = winner
+            return self._cache_writer is not None
+
+        return True
+
+    def print_sampling(self):
+        print(
+            f"Decoded 1 of every {self._stride} frames, "
+            f"{self._reader.get_no_grabbed()} frames were only grabbed"
+        )
+
+    def print_latency(self):
+        print(f"Dropped {self._reader.get_no_dropped()} frames while processing")
+
+        latency = self.metrics.get_histogram(EVENT_LATENCY)
+        if latency is None:
+            return
+
+        print(
+            f"Event latency: p50 {latency.quantile(0.5) * 1000:.0f} ms, "
+            f"p99 {latency.quantile(0.99) * 1000:.0f} ms, "
+            f"max {latency.get_max() * 1000:.0f} ms"
+        )
+
+    def print_table_region(self):
+        print(
+            f"Detected cards in the table area {self._table_region.get_region()}, "
+            f"{self._table_region.get_no_checks()} full frames were checked"
+        )
+
+    def print_skip_rate(self):
+        print(
+            f"Motion gate skipped {self._motion_gate.get_no_skipped()} of "
+            f"{self._motion_gate.get_no_frames()} frames "
+            f"({self._motion_gate.get_skip_rate():.1%})"
+        )
 
     def print_winner(self, winner):
         print(f"Player {winner.get_id()} won the game of Russian Schnapsen!")
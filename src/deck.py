@@ -0,0 +1,62 @@
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+VALUES = ["9", "10", "J", "Q", "K", "A"]
+SUITS = ["H", "D", "C", "S"]
+# Every card of the deck has an index, the cards of a suit are consecutive
+CARD_NAMES = [value + suit for suit in SUITS for value in VALUES]
+NO_CARDS = len(CARD_NAMES)
+
+# Sets of cards are bitmasks with the bit of every card at its index
+EMPTY = 0
+FULL_DECK = (1 << NO_CARDS) - 1
+
+_INDICES = {name: ind for ind, name in enumerate(CARD_NAMES)}
+
+
+def card_index(name: str) -> int:
+    """
+    :return: Index of the card in the deck.
+    """
+    ind = _INDICES.get(name)
+    if ind is None:
+        raise ValueError(f"Unknown card: {name}")
+
+    return ind
+
+
+def card_mask(names: Iterable[str]) -> int:
+    """
+    :return: Bitmask of the set of cards.
+    """
+    mask = EMPTY
+    for name in names:
+        mask |= 1 << card_index(name)
+
+    return mask
+
+
+def card_names(mask: int) -> List[str]:
+    """
+    :return: Names of the cards in the bitmask, in the deck order.
+    """
+    return [name for ind, name in enumerate(CARD_NAMES) if mask >> ind & 1]
+
+
+def no_cards(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+def deck_bits(names: Sequence[str]) -> np.ndarray:
+    """
+    Maps the classes of a model to the deck.
+
+    :param names: Class names of the model.
+    :return: Bit of every class in the card bitmasks, 0 for the classes that
+        are not cards of the deck.
+    """
+    return np.array(
+        [1 << _INDICES[name] if name in _INDICES else 0 for name in names],
+        dtype=np.int64,
+    )
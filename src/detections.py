@@ -0,0 +1,142 @@
+from typing import Sequence
+
+import numpy as np
+
+from votes import MIN_CONFIDENCE, CardVotes
+
+# Column layout of the per-frame detections returned by the Detector,
+# the same as the xyxy output of YOLOv5
+XMIN, YMIN, XMAX, YMAX, CONFIDENCE, CLASS = range(6)
+DETECTION_COLUMNS = 6
+
+DETECTIONS_PER_FRAME = 64
+
+
+def empty_detections() -> np.ndarray:
+    return np.empty((0, DETECTION_COLUMNS), dtype=np.float32)
+
+
+class DetectionBuffer:
+    """
+    Fixed-capacity columnar store for the detections of a window of frames.
+
+    The columns are allocated once and reused across windows, clearing the
+    buffer only resets its cursor. When the capacity is exceeded the oldest
+    detections are overwritten. The hit counters of the window are kept up
+    to date on every append.
+    """
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        capacity: int,
+        min_confidence: float = MIN_CONFIDENCE,
+    ) -> None:
+        self._names: np.ndarray = np.asarray(names)
+        self._capacity: int = capacity
+
+        self._frames: np.ndarray = np.zeros(capacity, dtype=np.int64)
+        self._class_ids: np.ndarray = np.zeros(capacity, dtype=np.int64)
+        self._confidences: np.ndarray = np.zeros(capacity, dtype=np.float32)
+        self._boxes: np.ndarray = np.zeros((capacity, 4), dtype=np.float32)
+
+        self._start: int = 0
+        self._size: int = 0
+        self._no_frames: int = 0
+        self._last_frame: int = -1
+
+        self._votes: CardVotes = CardVotes(names, min_confidence)
+
+    def append(self, detections: np.ndarray, frame_index: int) -> None:
+        """
+        Appends the detections of a single frame.
+
+        :param detections: Array of shape (N, 6) with the xyxy boxes,
+            confidences and class ids of the detected cards.
+        :param frame_index: Index of the frame in the video.
+        """
+        self._no_frames += 1
+        self._last_frame = frame_index
+
+        class_ids = detections[:, CLASS].astype(np.int64)
+        self._votes.update(class_ids, detections[:, CONFIDENCE])
+
+        no_detections = len(detections)
+        if no_detections > self._capacity:
+            detections = detections[-self._capacity :]
+            class_ids = class_ids[-self._capacity :]
+            no_detections = self._capacity
+
+        end = self._start + self._size
+        positions = (end + np.arange(no_detections)) % self._capacity
+
+        self._frames[positions] = frame_index
+        self._class_ids[positions] = class_ids
+        self._confidences[positions] = detections[:, CONFIDENCE]
+        self._boxes[positions] = detections[:, XMIN : YMAX + 1]
+
+        overflow = self._size + no_detections - self._capacity
+        if overflow > 0:
+            self._start = (self._start + overflow) % self._capacity
+            self._size = self._capacity
+        else:
+            self._size += no_detections
+
+    def clear(self) -> None:
+        self._start = 0
+        self._size = 0
+        self._no_frames = 0
+        self._last_frame = -1
+        self._votes.reset()
+
+    def _ordered(self, column: np.ndarray) -> np.ndarray:
+        end = self._start + self._size
+        if end <= self._capacity:
+            return column[self._start : end]
+
+        return np.concatenate((column[self._start :], column[: end - self._capacity]))
+
+    def get_names(self) -> np.ndarray:
+        return self._names
+
+    def get_frames(self) -> np.ndarray:
+        return self._ordered(self._frames)
+
+    def get_class_ids(self) -> np.ndarray:
+        return self._ordered(self._class_ids)
+
+    def get_confidences(self) -> np.ndarray:
+        return self._ordered(self._confidences)
+
+    def get_boxes(self) -> np.ndarray:
+        return self._ordered(self._boxes)
+
+    def get_votes(self) -> CardVotes:
+        return self._votes
+
+    def get_no_frames(self) -> int:
+        return self._no_frames
+
+    def get_last_frame(self) -> int:
+        """
+        :return: Index of the last frame appended since the buffer was
+            cleared, -1 if there is none.
+        """
+        return self._last_frame
+
+    def get_capacity(self) -> int:
+        return self._capacity
+
+    def is_empty(self) -> bool:
+        return self._size == 0
+
+    def __len__(self) -> int:
+        return self._size
+
+
+if __name__ == "__main__":
+    buffer = DetectionBuffer(["9H", "10H"], 4)
+    buffer.append(np.array([[0, 0, 10, 10, 0.9, 1], [5, 5, 20, 20, 0.4, 0]]), 0)
+    buffer.append(np.array([[0, 0, 10, 10, 0.8, 1], [5, 5, 20, 20, 0.3, 0]]), 1)
+    buffer.append(np.array([[0, 0, 10, 10, 0.7, 1]]), 2)
+    print(buffer.get_frames(), buffer.get_names()[buffer.get_class_ids()])
@@ -1,27 +1,68 @@
 from pathlib import Path
+from typing import List, Union
 
-import pandas as pd
-import torch
+import numpy as np
 
-REPO = "ultralytics/yolov5"
-CUSTOM_MODEL = "custom"
+from backends import REPO, load_backend
+from detections import DETECTIONS_PER_FRAME
 
 
 class Detector:
-    def __init__(self, weights_path: Path):
+    def __init__(
+        self,
+        weights_path: Path,
+        backend: Union[str, None] = None,
+        repo: str = REPO,
+        threads: int = 0,
+    ):
         self._model: Path = weights_path
 
         # Load the YOLO model
-        self.model = torch.hub.load(REPO, CUSTOM_MODEL, path=weights_path)
+        self._backend = load_backend(
+            weights_path, backend, repo, DETECTIONS_PER_FRAME, threads
+        )
+        self._names: List[str] = self._backend.get_names()
 
-    def detect_cards(self, frame) -> pd.DataFrame:
+    def get_names(self) -> List[str]:
+        """
+        :return: The card names indexed by the class ids of the model.
+        """
+        return self._names
+
+    def get_img_size(self) -> int:
+        return self._backend.get_img_size()
+
+    def get_img_sizes(self) -> List[int]:
+        """
+        :return: Input sizes the model can be switched to, largest first.
+        """
+        return self._backend.get_img_sizes()
+
+    def set_img_size(self, img_size: int) -> None:
+        self._backend.set_img_size(img_size)
+
+    def detect_cards(self, frame) -> np.ndarray:
         """
         Detects the cards in the given frame.
 
         :param frame: The frame to detect cards in.
-        :return: A DataFrame containing the detected cards.
+        :return: An array of shape (N, 6) with the xyxy boxes, confidences
+            and class ids of the detected cards.
+        """
+        return self._backend.infer([frame])[0]
+
+    def detect_cards_batch(self, frames: List) -> List[np.ndarray]:
         """
-        return self.model(frame).pandas().xyxy[0]
+        Detects the cards in all given frames using a single forward pass.
+
+        :param frames: The frames to detect cards in.
+        :return: An array of the detected cards for each frame, see
+            detect_cards.
+        """
+        if len(frames) == 0:
+            return []
+
+        return self._backend.infer(frames)
 
 
 if __name__ == "__main__":
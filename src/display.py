@@ -0,0 +1,194 @@
+import threading
+import time
+from typing import Dict, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+from detections import CLASS, XMIN, YMAX
+from metrics import DISPLAY, DRAW, Metrics
+
+WINDOW_NAME = "frame"
+COLOR = (0, 128, 0)
+FONT = cv2.FONT_HERSHEY_PLAIN
+FONT_SCALE = 2
+THICKNESS = 2
+# Offset of the label baseline above the box
+LABEL_OFFSET = 10
+POLL_TIMEOUT = 0.1
+
+
+class LabelSprites:
+    """
+    Card labels rendered once and pasted into the frames, instead of
+    rendering the text of every box in every frame.
+    """
+
+    def __init__(self, names: Sequence[str]) -> None:
+        self._names = names
+        self._sprites: Dict[int, Tuple[np.ndarray, np.ndarray, Tuple[int, int]]] = {}
+        for class_id, name in enumerate(names):
+            self._sprites[class_id] = self._render(str(name))
+
+    def _render(self, name: str) -> Tuple[np.ndarray, np.ndarray, Tuple[int, int]]:
+        (width, height), baseline = cv2.getTextSize(
+            name, FONT, FONT_SCALE, THICKNESS
+        )
+        # Margins for the strokes reaching out of the text box
+        height += baseline + 2 * THICKNESS
+        width += 2 * THICKNESS
+        origin = (THICKNESS, height - baseline - 1)
+
+        mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.putText(mask, name, origin, FONT, FONT_SCALE, 255, THICKNESS)
+
+        # The edges of the glyphs are antialiased, the label is alpha blended
+        alpha = (mask / 255).astype(np.float32)[..., None]
+        sprite = alpha * np.array(COLOR, dtype=np.float32)
+
+        return sprite, alpha, origin
+
+    def draw(self, frame: np.ndarray, detected_cards: np.ndarray) -> None:
+        """
+        Draws the boxes and labels of the detected cards into the frame.
+        """
+        frame_height, frame_width = frame.shape[:2]
+        for det_card in detected_cards:
+            xmin, ymin, xmax, ymax = det_card[XMIN : YMAX + 1].astype(int)
+            cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), COLOR, THICKNESS)
+
+            sprite, alpha, (origin_x, origin_y) = self._sprites[int(det_card[CLASS])]
+            top, left = ymin - LABEL_OFFSET - origin_y, xmin - origin_x
+            height, width = alpha.shape[:2]
+
+            # Parts of the label outside of the frame are cut off
+            y0, x0 = max(top, 0), max(left, 0)
+            y1 = min(top + height, frame_height)
+            x1 = min(left + width, frame_width)
+            if y1 <= y0 or x1 <= x0:
+                continue
+
+            rows, cols = slice(y0 - top, y1 - top), slice(x0 - left, x1 - left)
+            region = frame[y0:y1, x0:x1]
+            region[:] = region * (1 - alpha[rows, cols]) + sprite[rows, cols]
+
+
+class Display:
+    """
+    Draws the annotated frames in a separate thread and shows them from the
+    thread submitting the frames.
+
+    Only the latest submitted frame is kept, frames submitted while the
+    previous one is still being drawn are dropped, so the preview never
+    holds back the processing. HighGUI on macOS and in Qt builds does not
+    support windows driven from other threads, the OpenCV windows are
+    created, updated and destroyed from the submitting thread, which has
+    to be the main one.
+    """
+
+    def __init__(self, names: Sequence[str], metrics: Union[Metrics, None] = None):
+        self._sprites = LabelSprites(names)
+        self._metrics = metrics
+
+        self._latest: Union[Tuple[np.ndarray, np.ndarray], None] = None
+        self._drawn: Union[np.ndarray, None] = None
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._closed = threading.Event()
+        self._thread: Union[threading.Thread, None] = None
+        self._error: Union[BaseException, None] = None
+        self._shown: bool = False
+
+        self._no_dropped: int = 0
+
+    def start(self) -> None:
+        self._no_dropped = 0
+        self._error = None
+        self._latest = None
+        self._drawn = None
+        self._stop.clear()
+        self._closed.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._condition:
+            self._condition.notify()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        if self._shown:
+            cv2.destroyAllWindows()
+            self._shown = False
+
+    def submit(self, frame: np.ndarray, detected_cards: np.ndarray) -> None:
+        """
+        Replaces the BGR frame waiting to be drawn and shows the last drawn
+        frame, if there is a new one. The frame is not modified.
+        """
+        with self._condition:
+            if self._latest is not None:
+                self._no_dropped += 1
+            self._latest = (frame, detected_cards)
+            drawn, self._drawn = self._drawn, None
+            self._condition.notify()
+
+        if drawn is None:
+            return
+
+        start = time.perf_counter()
+        cv2.imshow(WINDOW_NAME, drawn)
+        self._shown = True
+        if cv2.waitKey(1) & 0xFF == ord("q"):
+            self._closed.set()
+
+        if self._metrics is not None:
+            self._metrics.observe(DISPLAY, time.perf_counter() - start)
+
+    def is_closed(self) -> bool:
+        """
+        :return: True if the user asked to quit from the preview window or
+            the drawing thread failed.
+        """
+        return self._closed.is_set()
+
+    def get_error(self) -> Union[BaseException, None]:
+        return self._error
+
+    def get_no_dropped(self) -> int:
+        return self._no_dropped
+
+    def _run(self) -> None:
+        try:
+            self._draw_frames()
+        except BaseException as e:
+            self._error = e
+            self._closed.set()
+
+    def _draw_frames(self) -> None:
+        while not self._stop.is_set():
+            with self._condition:
+                while self._latest is None and not self._stop.is_set():
+                    self._condition.wait(POLL_TIMEOUT)
+
+                latest, self._latest = self._latest, None
+
+            if latest is None:
+                continue
+
+            frame, detected_cards = latest
+            start = time.perf_counter()
+
+            # The decoded frame buffers are reused, the labels are drawn into
+            # a copy
+            frame = frame.copy()
+            self._sprites.draw(frame, detected_cards)
+
+            with self._condition:
+                self._drawn = frame
+
+            if self._metrics is not None:
+                self._metrics.observe(DRAW, time.perf_counter() - start)
@@ -0,0 +1,183 @@
+import json
+import queue
+from enum import Enum, unique
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Union
+
+# Number of events written to a JSONL file at once
+EVENT_BUFFER = 64
+
+
+@unique
+class EventType(Enum):
+    """
+    Events of the game and the keys of their data.
+    """
+
+    # stage
+    STAGE_CHANGED = "STAGE_CHANGED"
+    # card, player (None for the stock), cards (of every player), stock
+    CARD_DEALT = "CARD_DEALT"
+    # card, player, cards (of every player), stock
+    STOCK_TAKEN = "STOCK_TAKEN"
+    # player, bid
+    BID_WON = "BID_WON"
+    # card, position (in the trick)
+    CARD_PLAYED = "CARD_PLAYED"
+    # player, suit, points
+    MARRIAGE_DECLARED = "MARRIAGE_DECLARED"
+    # player, cards (won), scores (of every player)
+    TRICK_WON = "TRICK_WON"
+    # player, scores (of every player)
+    GAME_ENDED = "GAME_ENDED"
+
+    def __str__(self):
+        return self.value
+
+    def __repr__(self):
+        return self.value
+
+
+class Event:
+    __slots__ = ("type", "frame", "timestamp", "data")
+
+    def __init__(
+        self, event_type: EventType, frame: int, timestamp: float, data: Dict[str, Any]
+    ) -> None:
+        """
+        :param frame: Index of the last frame of the window the event was
+            detected in.
+        :param timestamp: time.time() of the detection.
+        """
+        self.type: EventType = event_type
+        self.frame: int = frame
+        self.timestamp: float = timestamp
+        self.data: Dict[str, Any] = data
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": self.type.value,
+            "frame": self.frame,
+            "timestamp": self.timestamp,
+            **self.data,
+        }
+
+    def __repr__(self):
+        return f"Event({self.type}, frame={self.frame}, {self.data})"
+
+
+Listener = Callable[[Event], None]
+
+
+class ConsoleSink:
+    """
+    Prints the events in the format of the verbose output of the game.
+    """
+
+    def __call__(self, event: Event) -> None:
+        data = event.data
+        if event.type == EventType.STAGE_CHANGED:
+            # The end of the game is announced by GAME_ENDED
+            if data["stage"] != "ENDED":
+                print(f"Entering {data['stage'].lower()} stage.\n")
+
+        elif event.type in (EventType.CARD_DEALT, EventType.STOCK_TAKEN):
+            if event.type == EventType.CARD_DEALT:
+                print("New card:", data["card"])
+                print()
+            for player, no_cards in enumerate(data["cards"]):
+                print(f"Player {player}. has {no_cards} cards")
+            print("-----------")
+            print(f"Cards in stock: {data['stock']}\n")
+
+        elif event.type == EventType.BID_WON:
+            print(
+                f"Player {data['player']}. won the bid with the value {data['bid']}\n"
+            )
+
+        elif event.type == EventType.CARD_PLAYED:
+            print("New card:", data["card"])
+
+        elif event.type == EventType.MARRIAGE_DECLARED:
+            print(f"\nNew trump suit: {data['suit']}")
+
+        elif event.type == EventType.TRICK_WON:
+            print(f"\nPlayer {data['player']}. won the round!")
+            print("End of the round.\n")
+            for player, score in enumerate(data["scores"]):
+                print(f"Player {player}, score: {score}")
+            print()
+
+        elif event.type == EventType.GAME_ENDED:
+            print("Player", data["player"], "won!")
+
+
+class JsonlSink:
+    """
+    Appends the events to a file, one JSON object per line. The lines are
+    buffered and written in chunks, the end of the game is written at once.
+    """
+
+    def __init__(self, path: Path, buffer_size: int = EVENT_BUFFER) -> None:
+        self._file = open(path, "a")
+        self._buffer_size: int = buffer_size
+        self._lines: List[str] = []
+
+    def __call__(self, event: Event) -> None:
+        self._lines.append(json.dumps(event.to_dict()))
+        if (
+            len(self._lines) >= self._buffer_size
+            or event.type == EventType.GAME_ENDED
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if self._lines:
+            self._file.write("\n".join(self._lines) + "\n")
+            self._lines = []
+        self._file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+
+class EventQueue:
+    """
+    Hands the events over to a consumer in another thread, which iterates
+    over the queue, or to an asyncio task, which iterates over it with
+    async for. The iteration ends once the queue is closed.
+    """
+
+    _CLOSED = None
+
+    def __init__(self) -> None:
+        self._queue: "queue.Queue[Union[Event, None]]" = queue.Queue()
+
+    def __call__(self, event: Event) -> None:
+        self._queue.put(event)
+
+    def close(self) -> None:
+        self._queue.put(self._CLOSED)
+
+    def __iter__(self) -> Iterator[Event]:
+        while True:
+            event = self._queue.get()
+            if event is self._CLOSED:
+                return
+            yield event
+
+    def __aiter__(self) -> "EventQueue":
+        return self
+
+    async def __anext__(self) -> Event:
+        import asyncio
+
+        # The producer is not running in the event loop, the blocking get is
+        # left to the default executor
+        loop = asyncio.get_running_loop()
+        event = await loop.run_in_executor(None, self._queue.get)
+        if event is self._CLOSED:
+            raise StopAsyncIteration
+
+        return event
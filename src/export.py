@@ -0,0 +1,155 @@
+import json
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Any
+
+from backends import CUSTOM_MODEL, IMG_SIZE, METADATA, ONNX, REPO, TORCHSCRIPT
+
+OPSET = 12
+EXPORT_FORMATS = [TORCHSCRIPT, ONNX]
+
+
+def load_network(weights_path: Path, repo: str = REPO, dynamic: bool = False) -> Any:
+    """
+    Loads the bare YOLOv5 network, without the AutoShape wrapper, prepared
+    for export.
+
+    :param dynamic: Prepare the detection head for a variable input size.
+    :return: The torch.nn.Module of the network.
+    """
+    # Torch is loaded only once the arguments have been checked
+    import torch
+
+    source = "local" if Path(repo).is_dir() else "github"
+    model = torch.hub.load(
+        repo, CUSTOM_MODEL, path=str(weights_path), source=source, autoshape=False
+    )
+    # Unwrap DetectMultiBackend if the hub returned one
+    model = getattr(model, "model", model)
+    model = model.float().eval()
+
+    for module in model.modules():
+        if type(module).__name__ == "Detect":
+            # Export mode makes the detection head return a single tensor
+            module.inplace = False
+            module.export = True
+            # The grids are rebuilt for every input size
+            module.dynamic = dynamic
+
+    return model
+
+
+def _metadata(model: Any, img_size: int, dynamic: bool = False) -> str:
+    names = [model.names[ind] for ind in range(len(model.names))]
+    return json.dumps({"names": names, "img_size": img_size, "dynamic": dynamic})
+
+
+def export_torchscript(model: Any, output_path: Path, img_size: int = IMG_SIZE) -> Path:
+    import torch
+
+    image = torch.zeros(1, 3, img_size, img_size)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, image, strict=False)
+
+    traced.save(str(output_path), _extra_files={METADATA: _metadata(model, img_size)})
+    return output_path
+
+
+def export_onnx(
+    model: Any,
+    output_path: Path,
+    img_size: int = IMG_SIZE,
+    dynamic: bool = False,
+) -> Path:
+    """
+    :param dynamic: Export with a variable input size up to img_size, which
+        the adaptive quality control can lower at runtime.
+    """
+    import onnx
+    import torch
+
+    image = torch.zeros(1, 3, img_size, img_size)
+    input_axes = {0: "batch"}
+    if dynamic:
+        input_axes.update({2: "height", 3: "width"})
+
+    torch.onnx.export(
+        model,
+        image,
+        str(output_path),
+        opset_version=OPSET,
+        do_constant_folding=True,
+        input_names=["images"],
+        output_names=["output"],
+        dynamic_axes={
+            "images": input_axes,
+            "output": {0: "batch", 1: "anchors"} if dynamic else {0: "batch"},
+        },
+    )
+
+    exported = onnx.load(str(output_path))
+    meta = exported.metadata_props.add()
+    meta.key, meta.value = METADATA, _metadata(model, img_size, dynamic)
+    onnx.save(exported, str(output_path))
+
+    return output_path
+
+
+def create_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        description="Converts YOLOv5 weights into formats loadable offline."
+    )
+
+    parser.add_argument(
+        "-w", "--weights", required=True, help="Path to yolo pre-trained weights",
+    )
+    parser.add_argument(
+        "-f",
+        "--formats",
+        nargs="+",
+        choices=EXPORT_FORMATS,
+        default=EXPORT_FORMATS,
+        help="Formats to export the weights to.",
+    )
+    parser.add_argument(
+        "--img-size",
+        type=int,
+        default=IMG_SIZE,
+        help="Input size of the exported model.",
+    )
+    parser.add_argument(
+        "--dynamic",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Export the ONNX model with a variable input size.",
+    )
+    parser.add_argument(
+        "--repo",
+        default=REPO,
+        help="YOLOv5 hub repository or path to its local checkout.",
+    )
+
+    return parser
+
+
+if __name__ == "__main__":
+    parser = create_parser()
+    args = parser.parse_args()
+
+    weights_path = Path(args.weights).resolve()
+    if not weights_path.exists():
+        raise FileNotFoundError("Weigths path invalid, file not found")
+
+    model = load_network(weights_path, args.repo, args.dynamic)
+    if TORCHSCRIPT in args.formats:
+        path = export_torchscript(
+            model, weights_path.with_suffix(".torchscript"), args.img_size
+        )
+        print(f"Exported {path}")
+
+    if ONNX in args.formats:
+        path = export_onnx(
+            model, weights_path.with_suffix(".onnx"), args.img_size, args.dynamic
+        )
+        print(f"Exported {path}")
@@ -0,0 +1,130 @@
+from pathlib import Path
+from typing import Any, List, Union
+
+import numpy as np
+
+from config import SAMPLE_EVERY
+
+
+def sampling_stride(
+    source_fps: float,
+    sample_every: int = SAMPLE_EVERY,
+    target_fps: Union[float, None] = None,
+) -> int:
+    """
+    :param source_fps: Native frame rate of the video, 0 if unknown.
+    :param sample_every: Keep every Nth frame of the video.
+    :param target_fps: Keep as many frames as needed for the frame rate,
+        overrides sample_every if the frame rate of the video is known.
+    :return: Number of native frames per sampled frame.
+    """
+    if target_fps is None or source_fps <= 0:
+        return max(sample_every, 1)
+
+    return max(round(source_fps / target_fps), 1)
+
+
+def get_video_fps(source_path: Path) -> float:
+    import cv2
+
+    cap = cv2.VideoCapture(str(source_path))
+    if not cap.isOpened():
+        raise RuntimeError("Could not open video")
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+
+    return fps
+
+
+class FrameReader:
+    """
+    Decodes the frames of a capture into a ring of preallocated buffers.
+
+    A buffer is handed out again after no_buffers reads, so the ring has to
+    be larger than the number of frames in flight at any time. The frames
+    are kept in the BGR order produced by the decoder, converting the channel
+    order is left to the preprocessing of the model.
+
+    With a stride above one only every stride-th frame is decoded, the
+    frames in between are grabbed, which demuxes them and advances the
+    decoder without retrieving them into an image.
+    """
+
+    def __init__(
+        self, cap: Any, no_buffers: int, stride: int = 1, start: int = 0
+    ) -> None:
+        """
+        :param cap: Opened cv2.VideoCapture.
+        :param start: Index of the frame at the current position of the
+            capture, if it was seeked.
+        """
+        self._cap = cap
+        self._buffers: List[Union[np.ndarray, None]] = [None] * no_buffers
+        self._next: int = 0
+        self._stride: int = stride
+        self._no_read: int = 0
+        self._no_grabbed: int = 0
+        self._position: int = start - 1
+
+    def read(self) -> Union[np.ndarray, None]:
+        """
+        Returns the frame at the current position of the capture first, the
+        following calls skip stride - 1 frames before each frame.
+
+        :return: The next sampled BGR frame or None at the end of the video.
+        """
+        if self._no_read > 0:
+            for _ in range(self._stride - 1):
+                if not self._cap.grab():
+                    return None
+                self._no_grabbed += 1
+
+        buffer = self._buffers[self._next]
+        if buffer is None:
+            ret, frame = self._cap.read()
+        else:
+            ret, frame = self._cap.read(buffer)
+
+        if not ret:
+            return None
+
+        self._position += 1 if self._no_read == 0 else self._stride
+        # The decoder allocates a new array if the frame size has changed
+        self._buffers[self._next] = frame
+        self._next = (self._next + 1) % len(self._buffers)
+        self._no_read += 1
+
+        return frame
+
+    def get_no_buffers(self) -> int:
+        return len(self._buffers)
+
+    def get_stride(self) -> int:
+        return self._stride
+
+    def set_stride(self, stride: int) -> None:
+        """
+        Changes the number of frames skipped before each of the following
+        frames.
+        """
+        self._stride = stride
+
+    def get_no_read(self) -> int:
+        """
+        :return: Number of frames decoded and returned so far.
+        """
+        return self._no_read
+
+    def get_position(self) -> int:
+        """
+        :return: Index of the last returned frame, counting from the start
+            position.
+        """
+        return self._position
+
+    def get_no_grabbed(self) -> int:
+        """
+        :return: Number of frames skipped without being retrieved.
+        """
+        return self._no_grabbed
@@ -1,42 +1,74 @@
-from typing import List, Union, Set
+import time
+from typing import Any, Dict, List, Union
 
-import pandas as pd
 import numpy as np
 
 from card import Card
+from config import THRESHOLD, trumps
+from deck import EMPTY, FULL_DECK, card_names, no_cards
+from detections import DetectionBuffer
+from events import ConsoleSink, Event, EventType, Listener
 from player import Player
+from rules import resolve_tricks, trump_index
 from state import State
 from verboser import Verboser
 
-NAME = "name"
-CONFIDENCE = "confidence"
-THRESHOLD = 8
-
 BIDDINGS = [[110], [100, 120], []]
-NO_CARDS_IN_DECK = 24
 CARDS_IN_STOCK = 3
 
 
 class Game:
-    def __init__(self, verbose: str) -> None:
+    def __init__(self, verbose: str, threshold: int = THRESHOLD) -> None:
         # TODO: Change start state to DEALING
         self._state: State = State.DEALING
         self._no_players: int = 3
         self._verbose: Verboser = Verboser(verbose)
+        self._threshold: int = threshold
 
         self.players: List[Player] = self._initialize_players()
         self.winner: Union[Player, None] = None
 
-        self._cards_dealt: Set[str] = set()
+        # Sets of cards are bitmasks, see deck
+        self._cards_dealt: int = EMPTY
         self._card_for_player: int = 0
         self._cards_in_stock: int = 0
 
-        self._cards_played: Set[str] = set()
+        self._cards_played: int = EMPTY
         self.current_trump: Union[str, None] = None
 
         # TODO: Change to a player that won the bidding
         self._round_starting_player: int = 0
         self._cards_in_round: List[Card] = []
+        self._round_mask: int = EMPTY
+
+        # Index of the last frame of the window being processed
+        self._frame: int = -1
+        self._listeners: List[Listener] = []
+        if self._verbose in (Verboser.INFO, Verboser.DEBUG):
+            self.subscribe(ConsoleSink())
+
+    def subscribe(self, listener: Listener) -> None:
+        """
+        :param listener: Called with every event of the game, see events.
+        """
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Listener) -> None:
+        self._listeners.remove(listener)
+
+    def _emit(self, event_type: EventType, **data) -> None:
+        if not self._listeners:
+            return
+
+        event = Event(event_type, self._frame, time.time(), data)
+        for listener in self._listeners:
+            listener(event)
+
+    def _player_cards(self) -> List[int]:
+        return [player.get_no_cards() for player in self.players]
+
+    def _player_scores(self) -> List[int]:
+        return [player.get_total_score() for player in self.players]
 
     def check_points(self) -> bool:
         for player in self.players:
@@ -45,16 +77,12 @@ class Game:
 
         return None
 
-    def _print_player_scores(self) -> None:
-        for player in self.players:
-            print(player)
-        print()
-
     def _reset_round(self, player_won_round: Player) -> None:
         for player in self.players:
             player.reset_player()
 
         self._cards_in_round = []
+        self._round_mask = EMPTY
         self._round_starting_player = player_won_round.get_id()
         self._state = State.PLAYING
 
@@ -67,167 +95,145 @@ class Game:
     def get_state(self) -> State:
         return self._state
 
-    def _update_played_cards(self, detected_card: str) -> None:
-        self._cards_played.update({detected_card})
+    def _update_played_cards(self, card: Card) -> None:
+        self._cards_played |= card.get_mask()
 
     def set_state(self, state: State) -> None:
         self._state = state
+        self._emit(EventType.STAGE_CHANGED, stage=str(state))
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """
+        The game changes only while a window is processed, a snapshot taken
+        in between the windows holds its whole state.
+
+        :return: JSON-serializable state of the game and its players, see
+            load_snapshot.
+        """
+        return {
+            "state": str(self._state),
+            "players": [player.get_snapshot() for player in self.players],
+            "winner": None if self.winner is None else self.winner.get_id(),
+            "cards_dealt": self._cards_dealt,
+            "card_for_player": self._card_for_player,
+            "cards_in_stock": self._cards_in_stock,
+            "cards_played": self._cards_played,
+            "current_trump": self.current_trump,
+            "round_starting_player": self._round_starting_player,
+            "cards_in_round": [card.get_name() for card in self._cards_in_round],
+            "frame": self._frame,
+        }
+
+    def load_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Restores the state saved by get_snapshot, no events are emitted.
+        """
+        if len(snapshot["players"]) != self._no_players:
+            raise ValueError("Snapshot was taken with a different number of players")
+
+        self._state = State(snapshot["state"])
+        for player, player_snapshot in zip(self.players, snapshot["players"]):
+            player.load_snapshot(player_snapshot)
+        self.winner = None
+        if snapshot["winner"] is not None:
+            self.winner = self.players[snapshot["winner"]]
+
+        self._cards_dealt = snapshot["cards_dealt"]
+        self._card_for_player = snapshot["card_for_player"]
+        self._cards_in_stock = snapshot["cards_in_stock"]
+        self._cards_played = snapshot["cards_played"]
+        self.current_trump = snapshot["current_trump"]
+        self._round_starting_player = snapshot["round_starting_player"]
+        self._cards_in_round = [Card(name) for name in snapshot["cards_in_round"]]
+        self._round_mask = EMPTY
+        for card in self._cards_in_round:
+            self._round_mask |= card.get_mask()
+        self._frame = snapshot["frame"]
 
     def _initialize_players(self) -> List[Player]:
         players = []
         for player_id in range(0, self._no_players):
-            players.append(Player(player_id, BIDDINGS[player_id]))
+            # Biddings are popped, every game needs its own copy
+            players.append(Player(player_id, list(BIDDINGS[player_id])))
 
         return players
 
-    def _update_winning_player(
-        self, ind: int, card: Card, winning_player: Player, pivot_card: Card
-    ) -> Union[Player, Card]:
-        if self._verbose == Verboser.DEBUG:
-            print(f"Ind: {ind} Card: {card} Pivot: {pivot_card}")
-        if ind == 0:
-            if self._verbose == Verboser.DEBUG:
-                print("First card, setting as pivot")
-            pivot_card = card
-            winning_player = self.players[self._round_starting_player]
-        elif card.get_suit() == pivot_card.get_suit():
-            if card > pivot_card:
-                if self._verbose == Verboser.DEBUG:
-                    print("Card has the same suit and has bigger value, changing pivot")
-                pivot_card = card
-                winning_player = self.players[
-                    (self._round_starting_player + ind) % self._no_players
-                ]
-            elif self._verbose == Verboser.DEBUG:
-                print("Card has the same suit but has smaller value, skipping")
-        # Current trump is not None
-        elif card.get_suit() == self.current_trump:
-            if self._verbose == Verboser.DEBUG:
-                print("Card has trump suit, changing pivot")
-            pivot_card = card
-            winning_player = self.players[
-                (self._round_starting_player + ind) % self._no_players
-            ]
-
-        self._update_played_cards(card.get_name())
-
-        return winning_player, pivot_card
-
     def _load_played_cards(self) -> Player:
-        if len(self._cards_in_round) > self._no_players:
-            if self._verbose == Verboser.DEBUG:
-                print("Detected trump cards")
-
-            trump_suit = None
-            pivot_card = None
-            winning_player = None
-            king_card_ind = None
-            for ind, card in enumerate(self._cards_in_round):
-                if card.is_queen():
-                    if self._verbose == Verboser.DEBUG:
-                        print("Card is queen, waiting for king")
-
-                    trump_suit = card.get_suit()
-
-                elif card.is_king() and card.get_suit() == trump_suit:
-                    if self._verbose == Verboser.DEBUG:
-                        print("Detected king with the same suit, setting trump suit")
-                    if self._verbose in (Verboser.INFO, Verboser.DEBUG):
-                        print(f"\nNew trump suit: {trump_suit}")
-
-                    king_card_ind = ind
-                    self.players[
-                        (self._round_starting_player + ind - 1) % self._no_players
-                    ].update_trump_score(trump_suit)
-                    trump_suit = None
-                    continue
-
-                elif trump_suit is not None:
-                    if self._verbose == Verboser.DEBUG:
-                        print("Card is not a king, no new trump suit")
-
-                    trump_suit = None
-
-                winning_player, pivot_card = self._update_winning_player(
-                    ind, card, winning_player, pivot_card
-                )
-
-            del self._cards_in_round[king_card_ind]
-            winning_player.update_cards_won(self._cards_in_round)
-            if self._verbose in (Verboser.INFO, Verboser.DEBUG):
-                print(f"\nPlayer {winning_player.get_id()}. won the round!")
-
-            return winning_player
+        if len(self._cards_in_round) < self._no_players:
+            raise Exception("Not enough cards in round!")
 
-        elif len(self._cards_in_round) == self._no_players:
-            pivot_card = None
-            winning_player = None
-            for ind, card in enumerate(self._cards_in_round):
-                winning_player, pivot_card = self._update_winning_player(
-                    ind, card, winning_player, pivot_card
+        trick = np.array([[card.get_index() for card in self._cards_in_round]])
+        winners, _, kings, _ = resolve_tricks(
+            trick, trump_index(self.current_trump), self._no_players
+        )
+        if self._verbose == Verboser.DEBUG:
+            print(f"Cards: {self._cards_in_round} Winning: {winners[0]}")
+
+        cards_won = []
+        for ind, card in enumerate(self._cards_in_round):
+            if kings[0, ind]:
+                # The queen of the marriage was played right before its king
+                player = self.players[
+                    (self._round_starting_player + ind - 1) % self._no_players
+                ]
+                player.update_trump_score(card.get_suit())
+                self._emit(
+                    EventType.MARRIAGE_DECLARED,
+                    player=player.get_id(),
+                    suit=card.get_suit(),
+                    points=trumps[card.get_suit()],
                 )
+                continue
+
+            self._update_played_cards(card)
+            cards_won.append(card)
+
+        winning_player = self.players[
+            (self._round_starting_player + winners[0]) % self._no_players
+        ]
+        winning_player.update_cards_won(cards_won)
+        self._emit(
+            EventType.TRICK_WON,
+            player=winning_player.get_id(),
+            cards=[card.get_name() for card in cards_won],
+            scores=self._player_scores(),
+        )
 
-            winning_player.update_cards_won(self._cards_in_round)
-            if self._verbose in (Verboser.INFO, Verboser.DEBUG):
-                print(f"\nPlayer {winning_player.get_id()}. won the round!")
-
-            return winning_player
-
-        else:
-            raise Exception("Not enough cards in round!")
+        return winning_player
 
     def _get_entering_card(
-        self, detected_cards: pd.DataFrame, dealing=False
+        self, detected_cards: DetectionBuffer, dealing=False
     ) -> Union[str, None]:
-        detected_set = set(detected_cards[NAME])
+        votes = detected_cards.get_votes()
 
         if dealing:
-            entering_card: set = detected_set - self._cards_dealt
+            new_card = votes.get_entering(self._cards_dealt, self._threshold)
         else:
-            entering_card: set = detected_set - (
-                self._cards_played
-                | set([card.get_name() for card in self._cards_in_round])
+            new_card = votes.get_entering(
+                self._cards_played | self._round_mask, self._threshold
             )
 
-        cut_cards = (
-            detected_cards[
-                (
-                    (detected_cards[NAME].isin(entering_card))
-                    & (detected_cards[CONFIDENCE] > 0.25)
-                )
-            ]
-            .groupby(NAME)
-            .filter(lambda x: len(x) > THRESHOLD)
-        )
-
-        cards_vals = cut_cards[NAME].value_counts().reset_index()
-        new_card = None
-        if not cards_vals.empty:
-            new_card, _ = cards_vals.iloc[cards_vals[NAME].idxmax()].replace({np.nan: None})
-
         if self._verbose == Verboser.DEBUG:
-            print("\nDetected:", detected_set)
+            print("\nDetected:", votes.get_detected())
             if dealing:
-                print("Dealt:", self._cards_dealt)
+                print("Dealt:", card_names(self._cards_dealt))
             else:
                 print(
                     "In round:", [card.get_name() for card in self._cards_in_round],
                 )
-                print("Played in game:", self._cards_played)
+                print("Played in game:", card_names(self._cards_played))
 
             print(f"New card: {new_card}\n")
 
         return new_card
 
-    def _dealing_stage(self, detected_cards: pd.DataFrame):
+    def _dealing_stage(self, detected_cards: DetectionBuffer):
         if self._verbose == Verboser.DEBUG:
             print("Dealing cards...")
 
-        if detected_cards.empty and (len(self._cards_dealt) == NO_CARDS_IN_DECK):
-            self._cards_dealt = set()
+        if detected_cards.is_empty() and self._cards_dealt == FULL_DECK:
+            self._cards_dealt = EMPTY
             self._card_for_player = 0
-            if self._verbose in (Verboser.INFO, Verboser.DEBUG):
-                print("Entering bidding stage.\n")
             self.set_state(State.BIDDING)
 
         card = self._get_entering_card(detected_cards, dealing=True)
@@ -235,11 +241,11 @@ class Game:
             # No new card detected
             return
 
-        if self._verbose in (Verboser.INFO, Verboser.DEBUG):
-            print("New card:", card)
-
+        # The stock is dealt to as the fourth player while it is not full
+        receiver = self._card_for_player
         if self._cards_in_stock < CARDS_IN_STOCK:
             if self._card_for_player == self._no_players:
+                receiver = None
                 self._cards_in_stock += 1
             else:
                 self.players[self._card_for_player].increase_no_cards()
@@ -252,22 +258,23 @@ class Game:
             self._card_for_player += 1
             self._card_for_player %= self._no_players
 
-        if self._verbose in (Verboser.INFO, Verboser.DEBUG):
-            print()
-            for player in self.players:
-                print(f"Player {player.get_id()}. has {player.get_no_cards()} cards")
-            print("-----------")
-            print(f"Cards in stock: {self._cards_in_stock}\n")
-
-        self._cards_dealt.update({card})
+        self._emit(
+            EventType.CARD_DEALT,
+            card=card,
+            player=receiver,
+            cards=self._player_cards(),
+            stock=self._cards_in_stock,
+        )
+        self._cards_dealt |= Card(card).get_mask()
 
-    def _stock_stage(self, detected_cards: pd.DataFrame):
+    def _stock_stage(self, detected_cards: DetectionBuffer):
         if self._verbose == Verboser.DEBUG:
             print("Stock stage...")
 
-        if detected_cards.empty and len(self._cards_dealt) == self._no_players:
-            if self._verbose in (Verboser.INFO, Verboser.DEBUG):
-                print("Entering playing stage.\n")
+        if (
+            detected_cards.is_empty()
+            and no_cards(self._cards_dealt) == self._no_players
+        ):
             self.set_state(State.PLAYING)
 
         else:
@@ -276,9 +283,10 @@ class Game:
                 # No new card detected
                 return
 
-            self._cards_dealt.update({card})
+            self._cards_dealt |= Card(card).get_mask()
 
             if self._cards_in_stock > 0:
+                receiver = self._card_for_player
                 self.players[self._card_for_player].increase_no_cards()
                 self._cards_in_stock -= 1
                 self._card_for_player += 1
@@ -286,13 +294,13 @@ class Game:
             else:
                 raise Exception("Wrong detection, game cannot be continued!")
 
-            if self._verbose in (Verboser.INFO, Verboser.DEBUG):
-                for player in self.players:
-                    print(
-                        f"Player {player.get_id()}. has {player.get_no_cards()} cards"
-                    )
-                print("-----------")
-                print(f"Cards in stock: {self._cards_in_stock}\n")
+            self._emit(
+                EventType.STOCK_TAKEN,
+                card=card,
+                player=receiver,
+                cards=self._player_cards(),
+                stock=self._cards_in_stock,
+            )
 
     def _bidding_stage(self):
         if self._verbose == Verboser.DEBUG:
@@ -315,35 +323,34 @@ class Game:
                 break
 
         self._round_starting_player = winning_player.get_id()
-        if self._verbose in (Verboser.INFO, Verboser.DEBUG):
-            print(
-                f"Player {self._round_starting_player}. won the bid with the value {winning_bid}\n"
-            )
-
-        if self._verbose in (Verboser.INFO, Verboser.DEBUG):
-            print("Entering stock stage.\n")
+        self._emit(
+            EventType.BID_WON, player=self._round_starting_player, bid=winning_bid
+        )
         self.set_state(State.STOCK)
 
-    def _playing_stage(self, detected_cards: pd.DataFrame):
+    def _playing_stage(self, detected_cards: DetectionBuffer):
         if self._verbose == Verboser.DEBUG:
             print("Playing stage...")
 
-        if len(self._cards_in_round) >= self._no_players and detected_cards.empty:
+        if (
+            len(self._cards_in_round) >= self._no_players
+            and detected_cards.is_empty()
+        ):
             if self._verbose == Verboser.DEBUG:
                 print("\nRound ending, computing scores...")
 
             player_won_round = self._load_played_cards()
             player_won = self.check_points()
             if player_won is not None:
-                print("Player", player_won.get_id(), "won!")
                 self.winner = player_won
+                self._emit(
+                    EventType.GAME_ENDED,
+                    player=player_won.get_id(),
+                    scores=self._player_scores(),
+                )
 
                 self.set_state(State.ENDED)
             else:
-                if self._verbose in (Verboser.INFO, Verboser.DEBUG):
-                    print("End of the round.\n")
-                    self._print_player_scores()
-
                 if self._verbose == Verboser.DEBUG:
                     print("Round reset...")
 
@@ -356,12 +363,18 @@ class Game:
                 # No new card detected
                 return
 
-            if self._verbose in (Verboser.INFO, Verboser.DEBUG):
-                print("New card:", card)
-
-            self._cards_in_round.append(Card(card))
+            card = Card(card)
+            self._cards_in_round.append(card)
+            self._round_mask |= card.get_mask()
+            self._emit(
+                EventType.CARD_PLAYED,
+                card=card.get_name(),
+                position=len(self._cards_in_round) - 1,
+            )
 
     def game_frame(self, detected_cards) -> Union[None, Player]:
+        self._frame = detected_cards.get_last_frame()
+
         if self.get_state() == State.DEALING:
             self._dealing_stage(detected_cards)
 
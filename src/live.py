@@ -0,0 +1,199 @@
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, List, Union
+
+import numpy as np
+
+# Frame rate assumed for the paced replay if the video does not report one
+DEFAULT_FPS = 30.0
+POLL_TIMEOUT = 0.1
+
+
+class PacedCapture:
+    """
+    Stand-in for a live camera replaying a video file at its native frame
+    rate. A frame is not available before the time it would have been
+    captured, so a slow consumer falls behind the same way as with a camera.
+
+    Implements the part of the cv2.VideoCapture interface used by the
+    controller.
+    """
+
+    def __init__(self, source_path: Path) -> None:
+        import cv2
+
+        self._cap = cv2.VideoCapture(str(source_path))
+        fps = self._cap.get(cv2.CAP_PROP_FPS)
+        self._interval: float = 1 / (fps if fps > 0 else DEFAULT_FPS)
+        self._start: Union[float, None] = None
+        self._no_grabbed: int = 0
+
+    def isOpened(self) -> bool:
+        return self._cap.isOpened()
+
+    def grab(self) -> bool:
+        now = time.perf_counter()
+        if self._start is None:
+            self._start = now
+
+        delay = self._start + self._no_grabbed * self._interval - now
+        if delay > 0:
+            time.sleep(delay)
+
+        self._no_grabbed += 1
+        return self._cap.grab()
+
+    def retrieve(self, image: Union[np.ndarray, None] = None):
+        return self._cap.retrieve(image)
+
+    def read(self, image: Union[np.ndarray, None] = None):
+        if not self.grab():
+            return False, None
+
+        return self.retrieve(image)
+
+    def get(self, prop: int) -> float:
+        return self._cap.get(prop)
+
+    def release(self) -> None:
+        self._cap.release()
+
+
+def open_live(source: str) -> Any:
+    """
+    :param source: Camera index, stream URL or a video file replayed at its
+        native frame rate.
+    :return: Capture of the live source.
+    """
+    if Path(source).is_file():
+        return PacedCapture(Path(source))
+
+    import cv2
+
+    return cv2.VideoCapture(int(source) if source.isdigit() else source)
+
+
+class LiveReader:
+    """
+    Reads a live source in a capture thread, which always holds only the
+    freshest frame. The frames captured while the previous one is still
+    being processed are dropped, so the processing never works on a stale
+    frame and the latency does not grow when inference lags.
+
+    The frames are captured into reused buffers, a buffer handed out is not
+    written to again before no_buffers more frames have been read.
+    """
+
+    def __init__(self, cap: Any, no_buffers: int) -> None:
+        """
+        :param cap: Opened live capture, see open_live.
+        """
+        self._cap = cap
+        self._no_buffers: int = no_buffers
+        self._free: List[np.ndarray] = []
+        self._handed_out: Deque[np.ndarray] = deque()
+
+        self._latest: Union[np.ndarray, None] = None
+        self._latest_at: float = 0.0
+        self._no_captured: int = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._ended: bool = False
+        self._thread: Union[threading.Thread, None] = None
+        self._error: Union[BaseException, None] = None
+
+        self._no_read: int = 0
+        self._position: int = -1
+        self._captured_at: float = 0.0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        try:
+            self._capture_frames()
+        except BaseException as e:
+            self._error = e
+
+        with self._condition:
+            self._ended = True
+            self._condition.notify()
+
+    def _capture_frames(self) -> None:
+        while not self._stop.is_set():
+            with self._condition:
+                buffer = self._free.pop() if self._free else None
+
+            if buffer is None:
+                ret, frame = self._cap.read()
+            else:
+                ret, frame = self._cap.read(buffer)
+            captured_at = time.perf_counter()
+
+            if not ret:
+                return
+
+            with self._condition:
+                # The frame not taken by the processing is dropped
+                if self._latest is not None:
+                    self._free.append(self._latest)
+                self._latest = frame
+                self._latest_at = captured_at
+                self._no_captured += 1
+                self._condition.notify()
+
+    def read(self) -> Union[np.ndarray, None]:
+        """
+        Waits for a frame captured after the previously read one.
+
+        :return: The freshest BGR frame or None once the source has ended.
+        """
+        with self._condition:
+            while self._latest is None and not self._ended:
+                self._condition.wait(POLL_TIMEOUT)
+
+            frame, self._latest = self._latest, None
+            if frame is None:
+                if self._error is not None:
+                    raise self._error
+                return None
+
+            self._handed_out.append(frame)
+            if len(self._handed_out) > self._no_buffers:
+                self._free.append(self._handed_out.popleft())
+
+            self._no_read += 1
+            self._position = self._no_captured - 1
+            self._captured_at = self._latest_at
+
+        return frame
+
+    def get_position(self) -> int:
+        """
+        :return: Index of the last read frame in the stream.
+        """
+        return self._position
+
+    def get_captured_at(self) -> float:
+        """
+        :return: time.perf_counter() at the capture of the last read frame.
+        """
+        return self._captured_at
+
+    def get_no_read(self) -> int:
+        return self._no_read
+
+    def get_no_dropped(self) -> int:
+        """
+        :return: Number of captured frames never read.
+        """
+        return self._no_captured - self._no_read
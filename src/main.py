@@ -1,7 +1,24 @@
+import sys
 from pathlib import Path
 from argparse import ArgumentParser
 
-from controller import Controller
+# Only light modules are imported here, numpy, OpenCV and torch are loaded
+# once the arguments have been checked and only by the modes using them
+from config import (
+    BACKENDS,
+    CHECKPOINT_INTERVAL,
+    DETECT_EVERY,
+    MERGE_FRAMES,
+    MIN_CONFIDENCE,
+    MOTION_THRESHOLD,
+    REPO,
+    ROI_INTERVAL,
+    SAMPLE_EVERY,
+    SOCKET,
+    THRESHOLD,
+)
+from metrics import EXPORT_INTERVAL, Metrics
+from pipeline import QUEUE_SIZE
 
 
 def create_parser() -> ArgumentParser:
@@ -14,11 +31,32 @@ def create_parser() -> ArgumentParser:
         "--source",
         type=str,
         required=True,
-        help="The source video file to read from.",
+        help="The source video file to read from, a camera index or a stream "
+        "URL in live mode.",
     )
     parser.add_argument(
         "-w", "--weights", required=True, help="Path to yolo pre-trained weights",
     )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=None,
+        help="Inference backend, picked by the weights file suffix by default.",
+    )
+    parser.add_argument(
+        "--repo",
+        default=REPO,
+        help="YOLOv5 hub repository or path to its local checkout (torch backend).",
+    )
+    parser.add_argument(
+        "--server",
+        type=str,
+        nargs="?",
+        const=SOCKET,
+        default=None,
+        help="Detect the cards in a running detection server (see server.py) "
+        f"instead of loading the model (default socket: {SOCKET}).",
+    )
     parser.add_argument(
         "--no-show",
         required=False,
@@ -26,6 +64,201 @@ def create_parser() -> ArgumentParser:
         default=False,
         help="Do not show video",
     )
+    parser.add_argument(
+        "--live",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Process only the freshest frame of a live source, dropping the "
+        "frames captured in the meantime. Video files are replayed at their "
+        "native frame rate.",
+    )
+    parser.add_argument(
+        "--pipelined",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Run decoding, detection and game logic as concurrent stages",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=QUEUE_SIZE,
+        help="Number of batches buffered between pipeline stages, a batch holds "
+        "--batch-size frames or a single frame without batching.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        nargs="?",
+        const=MERGE_FRAMES,
+        default=0,
+        help=f"Detect cards in batches of frames (default batch: {MERGE_FRAMES}).",
+    )
+    parser.add_argument(
+        "--motion-threshold",
+        type=float,
+        nargs="?",
+        const=MOTION_THRESHOLD,
+        default=None,
+        help="Skip detection on frames with less motion than the threshold "
+        f"(default threshold: {MOTION_THRESHOLD}).",
+    )
+    parser.add_argument(
+        "--motion-region",
+        type=int,
+        nargs=4,
+        metavar=("XMIN", "YMIN", "XMAX", "YMAX"),
+        default=None,
+        help="Table area watched for motion, the whole frame by default.",
+    )
+    parser.add_argument(
+        "--roi",
+        type=int,
+        nargs=4,
+        metavar=("XMIN", "YMIN", "XMAX", "YMAX"),
+        default=None,
+        help="Table area the cards are detected in, the rest of the frame is "
+        "not passed to the model.",
+    )
+    parser.add_argument(
+        "--auto-roi",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Find the table area from the cards detected in full frames.",
+    )
+    parser.add_argument(
+        "--roi-interval",
+        type=int,
+        default=ROI_INTERVAL,
+        help="Number of detected frames between full-frame checks of the "
+        "table area found by --auto-roi.",
+    )
+    parser.add_argument(
+        "--track",
+        type=int,
+        nargs="?",
+        const=DETECT_EVERY,
+        default=None,
+        help="Detect cards only in every Nth frame and track them in between "
+        f"(default N: {DETECT_EVERY}).",
+    )
+    parser.add_argument(
+        "--track-max-age",
+        type=int,
+        default=None,
+        help="Frames a tracked card is kept without being detected, twice the "
+        "detection interval by default.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Directory to store the detections of the video in.",
+    )
+    parser.add_argument(
+        "--replay",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Run the game on the cached detections instead of the video.",
+    )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=None,
+        help="Split the video into segments detected by parallel processes.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="Number of inference threads, the backend default if not given, "
+        "the cores are split between the workers of --segments.",
+    )
+    parser.add_argument(
+        "--sample-every",
+        type=int,
+        default=SAMPLE_EVERY,
+        help="Detect cards in every Nth frame only, the rest is never decoded.",
+    )
+    parser.add_argument(
+        "--target-fps",
+        type=float,
+        default=None,
+        help="Sample the frames of the video down to the given frame rate.",
+    )
+    parser.add_argument(
+        "--frame-budget",
+        type=float,
+        default=None,
+        help="Detection time per video frame in seconds, the batch size, input "
+        "size and frame sampling are adjusted to meet it.",
+    )
+    parser.add_argument(
+        "--merge-frames",
+        type=int,
+        default=MERGE_FRAMES,
+        help="Number of sampled frames merged into a single game step.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=int,
+        default=THRESHOLD,
+        help="Number of merged frames a new card has to be detected in.",
+    )
+    parser.add_argument(
+        "--min-confidence",
+        type=float,
+        default=MIN_CONFIDENCE,
+        help="Detections with lower confidence are not counted.",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default=None,
+        help="Periodically save the state of the game and the video position "
+        "to the given file.",
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=CHECKPOINT_INTERVAL,
+        help="Seconds between two checkpoints.",
+    )
+    parser.add_argument(
+        "--resume",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Continue from the last checkpoint instead of the start of the "
+        "video.",
+    )
+    parser.add_argument(
+        "--events",
+        type=str,
+        default=None,
+        help="Append the events of the game to the given JSON Lines file.",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        type=str,
+        default=None,
+        help="Write the per-stage latency report to the given JSON file at exit.",
+    )
+    parser.add_argument(
+        "--metrics-prom",
+        type=str,
+        default=None,
+        help="Periodically rewrite the given file with Prometheus metrics.",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=EXPORT_INTERVAL,
+        help="Seconds between rewrites of the Prometheus metrics file.",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -42,12 +275,226 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     source_path = Path(args.source).resolve()
-    if not source_path.exists():
+    if args.live and not source_path.exists():
+        # Camera index or stream URL
+        source_path = args.source
+    elif not source_path.exists():
         raise FileNotFoundError("Source path invalid, file not found")
 
     weights_path = Path(args.weights).resolve()
     if not weights_path.exists():
         raise FileNotFoundError("Weigths path invalid, file not found")
 
-    controller = Controller(source_path, weights_path, args.verbose, args.no_show)
-    controller.run()
+    if args.merge_frames < 1:
+        raise ValueError("Number of merged frames has to be a positive number")
+
+    if args.sample_every < 1:
+        raise ValueError("Sampling interval has to be a positive number")
+
+    if args.target_fps is not None and args.target_fps <= 0:
+        raise ValueError("Target frame rate has to be a positive number")
+
+    if args.live:
+        if args.replay or args.segments is not None or args.pipelined:
+            raise ValueError(
+                "Live mode cannot be combined with replay, segments or pipelining"
+            )
+        if args.sample_every != SAMPLE_EVERY or args.target_fps is not None:
+            raise ValueError("Live mode samples the frames on its own")
+        # The frames dropped differ from run to run, the detections are not
+        # those of the video
+        if args.cache_dir is not None:
+            raise ValueError("Live mode cannot be combined with the cache")
+
+    if args.checkpoint is None:
+        if args.resume:
+            raise ValueError("Resuming needs the checkpoint file")
+    else:
+        if args.live or args.replay or args.segments is not None:
+            raise ValueError(
+                "Checkpoints cannot be combined with live mode, replay or segments"
+            )
+        if args.checkpoint_interval < 0:
+            raise ValueError("Checkpoint interval cannot be negative")
+        if args.resume and args.cache_dir is not None:
+            raise ValueError("The detections of a resumed run cannot be cached")
+
+    if args.frame_budget is not None:
+        if args.frame_budget <= 0:
+            raise ValueError("Frame budget has to be a positive number")
+        if args.pipelined or args.live:
+            raise ValueError(
+                "Frame budget cannot be combined with pipelining or live mode"
+            )
+        if args.sample_every != SAMPLE_EVERY or args.target_fps is not None:
+            raise ValueError("Frame budget adjusts the frame sampling on its own")
+        if args.cache_dir is not None or args.segments is not None:
+            raise ValueError(
+                "Frame budget cannot be combined with the cache or segments"
+            )
+
+    if args.replay and args.cache_dir is None:
+        raise ValueError("Replay needs the cache directory")
+
+    if args.batch_size < 0:
+        raise ValueError("Batch size cannot be negative")
+
+    if args.segments is not None and args.segments < 1:
+        raise ValueError("Number of segments has to be a positive number")
+
+    if args.queue_size < 1:
+        raise ValueError("Queue size has to be a positive number")
+
+    if (args.roi is not None or args.auto_roi) and args.roi_interval < 1:
+        raise ValueError("ROI interval has to be a positive number")
+
+    if args.track is not None and args.track < 1:
+        raise ValueError("Detection interval has to be a positive number")
+
+    from motion import MotionGate
+    from roi import TableRegion
+    from tracker import CardTracker
+
+    motion_gate = None
+    if args.motion_region is not None and args.motion_threshold is None:
+        args.motion_threshold = MOTION_THRESHOLD
+
+    if args.motion_threshold is not None:
+        motion_gate = MotionGate(args.motion_threshold, args.motion_region)
+
+    table_region = None
+    if args.roi is not None or args.auto_roi:
+        region = None if args.roi is None else tuple(args.roi)
+        table_region = TableRegion(region, args.roi_interval)
+
+    tracker = None
+    if args.track is not None:
+        max_age = args.track_max_age
+        if max_age is None:
+            max_age = 2 * args.track
+        tracker = CardTracker(args.track, max_age=max_age)
+
+    # The events of every mode are written, the file is opened only once the
+    # arguments have been checked
+    events = None
+    listeners = []
+    if args.events is not None:
+        from events import JsonlSink
+
+        events = JsonlSink(Path(args.events))
+        listeners.append(events)
+
+    if args.replay:
+        from cache import cache_path, detection_settings
+        from replay import replay
+
+        stride = args.sample_every
+        if args.target_fps is not None:
+            from frames import get_video_fps, sampling_stride
+
+            stride = sampling_stride(
+                get_video_fps(source_path), args.sample_every, args.target_fps
+            )
+
+        try:
+            replay(
+                cache_path(
+                    Path(args.cache_dir),
+                    source_path,
+                    weights_path,
+                    stride,
+                    detection_settings(motion_gate, table_region, tracker),
+                ),
+                args.verbose,
+                args.merge_frames,
+                args.threshold,
+                args.min_confidence,
+                stride,
+                listeners,
+            )
+        finally:
+            if events is not None:
+                events.close()
+        sys.exit(0)
+
+    if args.segments is not None:
+        from segments import run_segments
+
+        try:
+            run_segments(
+                source_path,
+                weights_path,
+                args.verbose,
+                args.segments,
+                {
+                    "backend": args.backend,
+                    "repo": args.repo,
+                    "threads": args.threads,
+                    "batch_size": args.batch_size,
+                    "sample_every": args.sample_every,
+                    "target_fps": args.target_fps,
+                },
+                None if args.cache_dir is None else Path(args.cache_dir),
+                args.merge_frames,
+                args.threshold,
+                args.min_confidence,
+                listeners,
+            )
+        finally:
+            if events is not None:
+                events.close()
+        sys.exit(0)
+
+    from checkpoint import Checkpointer
+    from controller import Controller
+
+    detector = None
+    if args.server is not None:
+        from server import RemoteDetector
+
+        detector = RemoteDetector(args.server)
+
+    checkpoint = None
+    if args.checkpoint is not None:
+        checkpoint = Checkpointer(Path(args.checkpoint), args.checkpoint_interval)
+
+    controller = Controller(
+        source_path,
+        weights_path,
+        args.verbose,
+        args.no_show,
+        pipelined=args.pipelined,
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        motion_gate=motion_gate,
+        backend=args.backend,
+        repo=args.repo,
+        threads=args.threads,
+        cache_dir=None if args.cache_dir is None else Path(args.cache_dir),
+        merge_frames=args.merge_frames,
+        threshold=args.threshold,
+        min_confidence=args.min_confidence,
+        sample_every=args.sample_every,
+        target_fps=args.target_fps,
+        live=args.live,
+        frame_budget=args.frame_budget,
+        table_region=table_region,
+        tracker=tracker,
+        detector=detector,
+        checkpoint=checkpoint,
+        resume=args.resume,
+        metrics=Metrics(
+            None if args.metrics_prom is None else Path(args.metrics_prom),
+            args.metrics_interval,
+        ),
+    )
+    for listener in listeners:
+        controller.game.subscribe(listener)
+
+    try:
+        controller.run()
+    finally:
+        if args.metrics_json is not None:
+            controller.metrics.write_json(Path(args.metrics_json))
+        if events is not None:
+            events.close()
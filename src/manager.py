@@ -0,0 +1,359 @@
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Union
+
+import numpy as np
+
+from config import BACKENDS, REPO, SOCKET
+from frames import FrameReader
+from game import Game, THRESHOLD
+from live import LiveReader, open_live
+from player import Player
+from votes import MIN_CONFIDENCE
+from window import GameWindow, MERGE_FRAMES
+
+# Frames detected in a single forward pass at most
+MAX_BATCH = 32
+
+
+class Table:
+    """
+    Video source of a single table and the game played on it.
+    """
+
+    def __init__(
+        self,
+        table_id: str,
+        source: str,
+        names: Sequence[str],
+        verbose: str = "silent",
+        merge_frames: int = MERGE_FRAMES,
+        threshold: int = THRESHOLD,
+        min_confidence: float = MIN_CONFIDENCE,
+        live: bool = False,
+    ) -> None:
+        import cv2
+
+        self._id: str = table_id
+        self._live: bool = live
+        self._cap = open_live(source) if live else cv2.VideoCapture(source)
+        if not self._cap.isOpened():
+            raise RuntimeError(f"Could not open video of table {table_id}")
+
+        # All frames of a window are held until the window is detected
+        if live:
+            self._reader = LiveReader(self._cap, merge_frames)
+            self._reader.start()
+        else:
+            self._reader = FrameReader(self._cap, merge_frames)
+
+        self._window = GameWindow(
+            Game(verbose, threshold), names, merge_frames, min_confidence
+        )
+        self._positions: List[int] = []
+        self._winner: Union[Player, None] = None
+        self._error: Union[str, None] = None
+        self._done: bool = False
+        self._no_frames: int = 0
+
+    def get_id(self) -> str:
+        return self._id
+
+    def get_game(self) -> Game:
+        return self._window.game
+
+    def get_winner(self) -> Union[Player, None]:
+        return self._winner
+
+    def get_error(self) -> Union[str, None]:
+        return self._error
+
+    def get_no_frames(self) -> int:
+        return self._no_frames
+
+    def is_done(self) -> bool:
+        return self._done
+
+    def read_window(self) -> List[np.ndarray]:
+        """
+        :return: Frames of the next window, fewer at the end of the video.
+        """
+        frames: List[np.ndarray] = []
+        self._positions = []
+        while len(frames) < self._window.get_merge_frames():
+            frame = self._reader.read()
+            if frame is None:
+                break
+
+            frames.append(frame)
+            self._positions.append(self._reader.get_position())
+
+        if not frames:
+            self.close()
+
+        return frames
+
+    def push(self, detections: List[np.ndarray]) -> None:
+        """
+        Feeds the detections of the frames read by read_window to the game.
+        """
+        for detected_cards, position in zip(detections, self._positions):
+            try:
+                winner = self._window.push(detected_cards, position)
+            except Exception as e:
+                # A broken game does not stop the games on the other tables
+                self._error = repr(e)
+                self.close()
+                return
+
+            self._no_frames += 1
+            if winner is not None:
+                self._winner = winner
+                self.close()
+                return
+
+    def close(self) -> None:
+        if self._done:
+            return
+
+        self._done = True
+        if self._live:
+            self._reader.stop()
+        self._cap.release()
+
+
+class GameManager:
+    """
+    Runs the games of many tables in a single process.
+
+    Every tick reads the next window of all tables in parallel and detects
+    all of their frames with a single batched detector call, the detections
+    are then routed to the game of their table. The games share nothing but
+    the detector.
+    """
+
+    def __init__(
+        self,
+        detector: Any,
+        verbose: str = "silent",
+        merge_frames: int = MERGE_FRAMES,
+        threshold: int = THRESHOLD,
+        min_confidence: float = MIN_CONFIDENCE,
+        max_batch: int = MAX_BATCH,
+    ) -> None:
+        """
+        :param detector: Detector or RemoteDetector shared by all tables.
+        """
+        self._detector = detector
+        self._verbose: str = verbose
+        self._merge_frames: int = merge_frames
+        self._threshold: int = threshold
+        self._min_confidence: float = min_confidence
+        self._max_batch: int = max_batch
+        self._tables: Dict[str, Table] = {}
+        self._no_ticks: int = 0
+
+    def add_table(self, table_id: str, source: str, live: bool = False) -> Table:
+        if table_id in self._tables:
+            raise ValueError(f"Table {table_id} already exists")
+
+        table = Table(
+            table_id,
+            source,
+            self._detector.get_names(),
+            self._verbose,
+            self._merge_frames,
+            self._threshold,
+            self._min_confidence,
+            live,
+        )
+        self._tables[table_id] = table
+
+        return table
+
+    def remove_table(self, table_id: str) -> None:
+        self._tables.pop(table_id).close()
+
+    def get_tables(self) -> List[Table]:
+        return list(self._tables.values())
+
+    def get_no_ticks(self) -> int:
+        return self._no_ticks
+
+    def _detect(self, frames: List[np.ndarray]) -> List[np.ndarray]:
+        detections = []
+        for start in range(0, len(frames), self._max_batch):
+            batch = frames[start : start + self._max_batch]
+            detections += self._detector.detect_cards_batch(batch)
+
+        return detections
+
+    def tick(self, pool: ThreadPoolExecutor) -> bool:
+        """
+        Runs the next window of every table that has not finished yet.
+
+        :return: False once the games of all tables have finished.
+        """
+        tables = [table for table in self._tables.values() if not table.is_done()]
+        if not tables:
+            return False
+
+        windows = list(pool.map(Table.read_window, tables))
+        frames = [frame for window in windows for frame in window]
+        detections = self._detect(frames)
+
+        offset = 0
+        for table, window in zip(tables, windows):
+            table.push(detections[offset : offset + len(window)])
+            offset += len(window)
+
+        self._no_ticks += 1
+        return True
+
+    def run(self) -> Dict[str, Union[Player, None]]:
+        """
+        Runs the games of all tables until they have finished.
+
+        :return: Winner of the game of every table, None if it has not been
+            determined.
+        """
+        with ThreadPoolExecutor(max(len(self._tables), 1)) as pool:
+            try:
+                while self.tick(pool):
+                    pass
+            finally:
+                for table in self._tables.values():
+                    table.close()
+
+        return {
+            table_id: table.get_winner() for table_id, table in self._tables.items()
+        }
+
+
+def create_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        description="Detects events in the games of many tables at once."
+    )
+
+    parser.add_argument(
+        "-s",
+        "--sources",
+        nargs="+",
+        required=True,
+        help="Video files of the tables, camera indices or stream URLs in live "
+        "mode.",
+    )
+    parser.add_argument(
+        "-w", "--weights", required=True, help="Path to yolo pre-trained weights",
+    )
+    parser.add_argument(
+        "--live",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Process only the freshest frames of live sources.",
+    )
+    parser.add_argument(
+        "--server",
+        type=str,
+        nargs="?",
+        const=SOCKET,
+        default=None,
+        help="Detect the cards in a running detection server (see server.py) "
+        f"instead of loading the model (default socket: {SOCKET}).",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=None,
+        help="Inference backend, picked by the weights file suffix by default.",
+    )
+    parser.add_argument(
+        "--repo",
+        default=REPO,
+        help="YOLOv5 hub repository or path to its local checkout (torch backend).",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="Number of inference threads, the backend default if not given.",
+    )
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=MAX_BATCH,
+        help="Maximum number of frames detected in a single forward pass.",
+    )
+    parser.add_argument(
+        "--merge-frames",
+        type=int,
+        default=MERGE_FRAMES,
+        help="Number of frames merged into a single game step.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=int,
+        default=THRESHOLD,
+        help="Number of merged frames a new card has to be detected in.",
+    )
+    parser.add_argument(
+        "--min-confidence",
+        type=float,
+        default=MIN_CONFIDENCE,
+        help="Detections with lower confidence are not counted.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        choices=["silent", "info", "debug"],
+        help="Prints debug information.",
+        default="silent",
+    )
+
+    return parser
+
+
+if __name__ == "__main__":
+    parser = create_parser()
+    args = parser.parse_args()
+
+    weights_path = Path(args.weights).resolve()
+    if not weights_path.exists():
+        raise FileNotFoundError("Weigths path invalid, file not found")
+
+    if args.max_batch < 1:
+        raise ValueError("Maximum batch size has to be a positive number")
+
+    if args.server is not None:
+        from server import RemoteDetector
+
+        detector = RemoteDetector(args.server)
+    else:
+        from detector import Detector
+
+        detector = Detector(weights_path, args.backend, args.repo, args.threads)
+
+    manager = GameManager(
+        detector,
+        args.verbose,
+        args.merge_frames,
+        args.threshold,
+        args.min_confidence,
+        args.max_batch,
+    )
+    for ind, source in enumerate(args.sources):
+        if not args.live and not Path(source).exists():
+            raise FileNotFoundError(f"Source path invalid, file not found: {source}")
+
+        manager.add_table(str(ind), source, args.live)
+
+    manager.run()
+    for table in manager.get_tables():
+        if table.get_error() is not None:
+            print(f"Table {table.get_id()}: failed with {table.get_error()}")
+        elif table.get_winner() is not None:
+            print(f"Table {table.get_id()}: player {table.get_winner().get_id()} won")
+        else:
+            print(f"Table {table.get_id()}: winner has not been determined")
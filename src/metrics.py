@@ -0,0 +1,211 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+DECODE = "decode"
+MOTION = "motion"
+# Latency of a single detector call, which covers a whole batch of frames
+# if batching is enabled
+DETECT = "detect"
+DRAW = "draw"
+DISPLAY = "display"
+GAME = "game"
+# Time from decoding the frame closing a window to the end of its game step
+WINDOW_EVENT = "window_event"
+# Time from capturing the first frame of a window to the end of its game
+# step, the latency from a card placed on the table to the game event
+EVENT_LATENCY = "event_latency"
+
+# Upper bounds of the histogram buckets in seconds, from 0.1 ms to ~13 s
+BUCKETS: List[float] = [1e-4 * 2 ** ind for ind in range(18)]
+QUANTILES = [0.5, 0.9, 0.99]
+EXPORT_INTERVAL = 10.0
+PROMETHEUS_PREFIX = "schnapsen"
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram, observing a value is a bisection and a
+    few additions.
+    """
+
+    def __init__(self) -> None:
+        self._counts: List[int] = [0] * (len(BUCKETS) + 1)
+        self._count: int = 0
+        self._sum: float = 0.0
+        self._max: float = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._counts[bisect_left(BUCKETS, seconds)] += 1
+            self._count += 1
+            self._sum += seconds
+            if seconds > self._max:
+                self._max = seconds
+
+    def get_count(self) -> int:
+        return self._count
+
+    def get_sum(self) -> float:
+        return self._sum
+
+    def get_max(self) -> float:
+        return self._max
+
+    def cumulative_counts(self) -> List[int]:
+        counts, total = [], 0
+        for count in self._counts:
+            total += count
+            counts.append(total)
+
+        return counts
+
+    def quantile(self, quantile: float) -> float:
+        """
+        :return: Upper bound of the bucket holding the quantile.
+        """
+        if self._count == 0:
+            return 0.0
+
+        rank = quantile * self._count
+        for bound, count in zip(BUCKETS, self.cumulative_counts()):
+            if count >= rank:
+                return min(bound, self._max)
+
+        return self._max
+
+    def to_dict(self) -> Dict[str, Any]:
+        report = {
+            "count": self._count,
+            "sum": self._sum,
+            "mean": self._sum / self._count if self._count else 0.0,
+            "max": self._max,
+        }
+        for quantile in QUANTILES:
+            report[f"p{int(quantile * 100)}"] = self.quantile(quantile)
+
+        report["buckets"] = {
+            str(bound): count for bound, count in zip(BUCKETS, self._counts)
+        }
+        report["buckets"]["+Inf"] = self._counts[-1]
+
+        return report
+
+
+class Metrics:
+    """
+    Per-stage latency histograms and frame throughput of a run.
+
+    The report can be written as JSON at the end of the run and as a
+    Prometheus text file rewritten periodically while it runs.
+    """
+
+    def __init__(
+        self,
+        prometheus_path: Union[Path, None] = None,
+        export_interval: float = EXPORT_INTERVAL,
+    ) -> None:
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        self._prometheus_path = prometheus_path
+        self._export_interval: float = export_interval
+
+        self._no_frames: int = 0
+        self._start: float = time.perf_counter()
+        self._last_export: float = self._start
+
+    def reset(self) -> None:
+        self._histograms = {}
+        self._no_frames = 0
+        self._start = time.perf_counter()
+        self._last_export = self._start
+
+    def _histogram(self, stage: str) -> Histogram:
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram())
+
+        return histogram
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self._histogram(stage).observe(seconds)
+
+    def get_histogram(self, stage: str) -> Union[Histogram, None]:
+        return self._histograms.get(stage)
+
+    def frame_done(self) -> None:
+        """
+        Counts a fully processed frame and rewrites the Prometheus file if
+        the export interval has passed.
+        """
+        self._no_frames += 1
+        if self._prometheus_path is None:
+            return
+
+        now = time.perf_counter()
+        if now - self._last_export >= self._export_interval:
+            self._last_export = now
+            self.write_prometheus(self._prometheus_path)
+
+    def get_fps(self) -> float:
+        elapsed = time.perf_counter() - self._start
+        return self._no_frames / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "frames": self._no_frames,
+            "seconds": time.perf_counter() - self._start,
+            "fps": self.get_fps(),
+            "stages": {
+                stage: histogram.to_dict()
+                for stage, histogram in sorted(self._histograms.items())
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        name = f"{PROMETHEUS_PREFIX}_stage_latency_seconds"
+        lines = [
+            f"# TYPE {PROMETHEUS_PREFIX}_frames_total counter",
+            f"{PROMETHEUS_PREFIX}_frames_total {self._no_frames}",
+            f"# TYPE {PROMETHEUS_PREFIX}_fps gauge",
+            f"{PROMETHEUS_PREFIX}_fps {self.get_fps():.3f}",
+            f"# TYPE {name} histogram",
+        ]
+        for stage, histogram in sorted(self._histograms.items()):
+            label = f'stage="{stage}"'
+            counts = histogram.cumulative_counts()
+            for bound, count in zip(BUCKETS, counts):
+                lines.append(f'{name}_bucket{{{label},le="{bound:g}"}} {count}')
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {counts[-1]}')
+            lines.append(f"{name}_sum{{{label}}} {histogram.get_sum():.6f}")
+            lines.append(f"{name}_count{{{label}}} {histogram.get_count()}")
+
+        return "\n".join(lines) + "\n"
+
+    def close(self) -> None:
+        """
+        Writes the final state of the Prometheus file.
+        """
+        if self._prometheus_path is not None:
+            self.write_prometheus(self._prometheus_path)
+
+    def write_json(self, path: Path) -> None:
+        _write_atomic(path, json.dumps(self.to_dict(), indent=4))
+
+    def write_prometheus(self, path: Path) -> None:
+        _write_atomic(path, self.to_prometheus())
+
+
+def _write_atomic(path: Path, content: str) -> None:
+    # Scrapers never see a half-written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as outfile:
+        outfile.write(content)
+
+    os.replace(tmp_path, path)
@@ -0,0 +1,92 @@
+from typing import Any, Dict, Tuple, Union
+
+import numpy as np
+
+from config import MOTION_THRESHOLD
+
+MOTION_WIDTH = 64
+
+
+class MotionGate:
+    """
+    Cheap change detector deciding whether a frame needs a new detection.
+
+    Frames are downscaled to a small grayscale thumbnail and compared to the
+    thumbnail of the last frame that went through the detector, so a slow
+    drift over many frames is still noticed.
+    """
+
+    def __init__(
+        self,
+        threshold: float = MOTION_THRESHOLD,
+        region: Union[Tuple[int, int, int, int], None] = None,
+    ) -> None:
+        """
+        :param threshold: Mean absolute difference of the thumbnails (0-255)
+            above which the frame is considered moving.
+        :param region: Table area (xmin, ymin, xmax, ymax) to watch, the whole
+            frame is used if not given.
+        """
+        self._threshold: float = threshold
+        self._region = region
+
+        self._reference: Union[np.ndarray, None] = None
+        self._no_frames: int = 0
+        self._no_skipped: int = 0
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        import cv2
+
+        if self._region is not None:
+            xmin, ymin, xmax, ymax = self._region
+            frame = frame[ymin:ymax, xmin:xmax]
+
+        height, width = frame.shape[:2]
+        size = (MOTION_WIDTH, max(1, height * MOTION_WIDTH // width))
+        thumbnail = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+        return cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+    def is_moving(self, frame: np.ndarray) -> bool:
+        """
+        :param frame: BGR frame to check.
+        :return: True if the frame differs enough from the last detected one.
+        """
+        self._no_frames += 1
+        thumbnail = self._thumbnail(frame)
+
+        if (
+            self._reference is not None
+            and np.abs(thumbnail - self._reference).mean() <= self._threshold
+        ):
+            self._no_skipped += 1
+            return False
+
+        self._reference = thumbnail
+        return True
+
+    def get_settings(self) -> Dict[str, Any]:
+        """
+        :return: Options changing the detections of a run, see cache_key.
+        """
+        return {
+            "motion_threshold": self._threshold,
+            "motion_region": None if self._region is None else list(self._region),
+        }
+
+    def reset(self) -> None:
+        self._reference = None
+        self._no_frames = 0
+        self._no_skipped = 0
+
+    def get_no_frames(self) -> int:
+        return self._no_frames
+
+    def get_no_skipped(self) -> int:
+        return self._no_skipped
+
+    def get_skip_rate(self) -> float:
+        if self._no_frames == 0:
+            return 0.0
+
+        return self._no_skipped / self._no_frames
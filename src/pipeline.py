@@ -0,0 +1,150 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List
+
+# Number of items held by every queue, the Controller passes batches of frames
+QUEUE_SIZE = 8
+POLL_TIMEOUT = 0.1
+
+
+class _End:
+    """
+    Marks the end of the stream flowing through the pipeline.
+    """
+
+
+class _Failure:
+    """
+    Carries an exception raised inside a stage to the consuming thread.
+    """
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+class Pipeline:
+    """
+    Runs a source and a chain of stages in separate threads connected by
+    bounded queues.
+
+    Every stage is served by exactly one thread and the queues are FIFO,
+    so items leave the pipeline in the order the source produced them.
+    A full queue blocks the stage feeding it, which throttles the faster
+    stages down to the pace of the slowest one.
+    """
+
+    def __init__(
+        self,
+        source: Iterable,
+        stages: List[Callable[[Any], Any]],
+        queue_size: int = QUEUE_SIZE,
+    ) -> None:
+        self._source = source
+        self._stages = stages
+        self._queues: List[queue.Queue] = [
+            queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)
+        ]
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def _put(self, out: queue.Queue, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                out.put(item, timeout=POLL_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    def _get(self, inbox: queue.Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return inbox.get(timeout=POLL_TIMEOUT)
+            except queue.Empty:
+                continue
+
+        return _End()
+
+    def _run_source(self, out: queue.Queue) -> None:
+        try:
+            for item in self._source:
+                if not self._put(out, item):
+                    return
+        except BaseException as e:
+            self._put(out, _Failure(e))
+            return
+
+        self._put(out, _End())
+
+    def _run_stage(
+        self, stage: Callable[[Any], Any], inbox: queue.Queue, out: queue.Queue
+    ) -> None:
+        while True:
+            item = self._get(inbox)
+            if isinstance(item, (_End, _Failure)):
+                self._put(out, item)
+                return
+
+            try:
+                result = stage(item)
+            except BaseException as e:
+                self._put(out, _Failure(e))
+                return
+
+            if not self._put(out, result):
+                return
+
+    def start(self) -> None:
+        self._threads.append(
+            threading.Thread(
+                target=self._run_source, args=(self._queues[0],), daemon=True
+            )
+        )
+        for ind, stage in enumerate(self._stages):
+            self._threads.append(
+                threading.Thread(
+                    target=self._run_stage,
+                    args=(stage, self._queues[ind], self._queues[ind + 1]),
+                    daemon=True,
+                )
+            )
+
+        for thread in self._threads:
+            thread.start()
+
+    def close(self) -> None:
+        """
+        Stops all stages and waits for their threads to finish.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+        self._threads = []
+
+    def __iter__(self) -> Iterator[Any]:
+        if not self._threads:
+            self.start()
+
+        out = self._queues[-1]
+        while True:
+            item = self._get(out)
+            if isinstance(item, _End):
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+
+            yield item
+
+    def __enter__(self) -> "Pipeline":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    with Pipeline(range(10), [lambda x: x * 2, lambda x: x + 1]) as p:
+        print(list(p))
@@ -1,4 +1,4 @@
-from typing import List, Union
+from typing import Any, Dict, List, Union
 
 from card import Card
 from config import trumps
@@ -55,6 +55,25 @@ class Player:
         self._no_cards = 0
         self._cards_won = []
 
+    def get_snapshot(self) -> Dict[str, Any]:
+        """
+        :return: JSON-serializable state of the player, see load_snapshot.
+        """
+        return {
+            "id": self._id,
+            "no_cards": self._no_cards,
+            "cards_won": [card.get_name() for card in self._cards_won],
+            "biddings": list(self._biddings),
+            "total_score": self._total_score,
+        }
+
+    def load_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        self._id = snapshot["id"]
+        self._no_cards = snapshot["no_cards"]
+        self._cards_won = [Card(name) for name in snapshot["cards_won"]]
+        self._biddings = list(snapshot["biddings"])
+        self._total_score = snapshot["total_score"]
+
     def __str__(self) -> str:
         return f"Player {self._id}, score: {self._total_score}"
 
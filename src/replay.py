@@ -0,0 +1,51 @@
+import sys
+from pathlib import Path
+from typing import Sequence, Union
+
+from cache import DetectionReader
+from events import Listener
+from game import Game, THRESHOLD
+from player import Player
+from votes import MIN_CONFIDENCE
+from window import GameWindow, MERGE_FRAMES
+
+
+def replay(
+    cache_path: Path,
+    verbose: str,
+    merge_frames: int = MERGE_FRAMES,
+    threshold: int = THRESHOLD,
+    min_confidence: float = MIN_CONFIDENCE,
+    stride: int = 1,
+    listeners: Sequence[Listener] = (),
+) -> Union[Player, None]:
+    """
+    Runs the game on cached detections, without decoding the video or
+    loading the model.
+
+    :param cache_path: Directory with the detections written by the Controller.
+    :param stride: Number of video frames per cached frame, the frames are
+        numbered as in the run that wrote the cache.
+    :param listeners: Subscribed to the events of the game, see events.
+    :return: The winner of the game or None if it has not been determined.
+    """
+    reader = DetectionReader(cache_path)
+    game = Game(verbose, threshold)
+    for listener in listeners:
+        game.subscribe(listener)
+    window = GameWindow(game, reader.get_names(), merge_frames, min_confidence)
+
+    for frame_index, detected_cards in enumerate(reader):
+        try:
+            winner = window.push(detected_cards, frame_index * stride)
+        except Exception as e:
+            print(e)
+            print("Terminating due to error")
+            sys.exit(-1)
+
+        if winner is not None:
+            print(f"Player {winner.get_id()} won the game of Russian Schnapsen!")
+            return winner
+
+    print("Winner has not been determined")
+    return None
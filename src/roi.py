@@ -0,0 +1,142 @@
+from typing import Any, Dict, Tuple, Union
+
+import numpy as np
+
+from config import ROI_INTERVAL
+from detections import XMAX, XMIN, YMAX, YMIN
+
+# Margin added around the cards seen on the table, fraction of the frame size
+ROI_MARGIN = 0.1
+# Detections closer to the border of the crop than this many pixels may be
+# cut off, the area is re-checked on the next frame
+BORDER = 2
+
+Region = Tuple[int, int, int, int]
+
+
+class TableRegion:
+    """
+    Area of the table the cards lie on, only this part of the frames is
+    passed to the detector.
+
+    The area is either given or found from the cards detected in full
+    frames. A full frame is detected periodically and whenever a card
+    touches the border of the crop, the area grows to cover all cards seen
+    so far. Until the first card is seen, the whole frame is detected.
+    """
+
+    def __init__(
+        self,
+        region: Union[Region, None] = None,
+        interval: int = ROI_INTERVAL,
+        margin: float = ROI_MARGIN,
+    ) -> None:
+        """
+        :param region: Fixed (xmin, ymin, xmax, ymax) area, found from the
+            detections if not given.
+        """
+        self._fixed: bool = region is not None
+        self._initial: Union[Region, None] = region
+        self._region: Union[Region, None] = region
+        self._interval: int = interval
+        self._margin: float = margin
+
+        self._no_frames: int = 0
+        self._checked_at: int = 0
+        self._recheck: bool = False
+        self._no_checks: int = 0
+
+    def reset(self) -> None:
+        self._region = self._initial
+        self._no_frames = 0
+        self._checked_at = 0
+        self._recheck = False
+        self._no_checks = 0
+
+    def get_settings(self) -> Dict[str, Any]:
+        """
+        :return: Options changing the detections of a run, see cache_key.
+        """
+        return {
+            "roi": None if self._initial is None else list(self._initial),
+            "roi_interval": self._interval,
+            "roi_margin": self._margin,
+        }
+
+    def get_region(self) -> Union[Region, None]:
+        return self._region
+
+    def get_no_checks(self) -> int:
+        """
+        :return: Number of full frames detected to find the area.
+        """
+        return self._no_checks
+
+    def crop(self, frame: np.ndarray) -> Tuple[np.ndarray, Region]:
+        """
+        :return: View of the part of the frame to detect cards in and its
+            (xmin, ymin, xmax, ymax) area in the frame.
+        """
+        height, width = frame.shape[:2]
+        self._no_frames += 1
+
+        if not self._fixed and (
+            self._region is None
+            or self._recheck
+            or self._no_frames - self._checked_at >= self._interval
+        ):
+            self._checked_at = self._no_frames
+            self._recheck = False
+            self._no_checks += 1
+            return frame, (0, 0, width, height)
+
+        xmin, ymin, xmax, ymax = self._region
+        xmin, ymin = max(xmin, 0), max(ymin, 0)
+        xmax, ymax = min(xmax, width), min(ymax, height)
+
+        return frame[ymin:ymax, xmin:xmax], (xmin, ymin, xmax, ymax)
+
+    def update(
+        self, detected_cards: np.ndarray, region: Region, frame_shape: Tuple[int, ...]
+    ) -> None:
+        """
+        Maps the detections made in the crop back to the frame, in place, and
+        updates the area from them.
+
+        :param region: Area of the crop returned by crop.
+        """
+        xmin, ymin, xmax, ymax = region
+        detected_cards[:, [XMIN, XMAX]] += xmin
+        detected_cards[:, [YMIN, YMAX]] += ymin
+        if self._fixed or len(detected_cards) == 0:
+            return
+
+        height, width = frame_shape[:2]
+        if region != (0, 0, width, height):
+            # A card on a border of the crop inside the frame may reach out
+            # of it
+            if (
+                (xmin > 0 and np.any(detected_cards[:, XMIN] <= xmin + BORDER))
+                or (ymin > 0 and np.any(detected_cards[:, YMIN] <= ymin + BORDER))
+                or (xmax < width and np.any(detected_cards[:, XMAX] >= xmax - BORDER))
+                or (ymax < height and np.any(detected_cards[:, YMAX] >= ymax - BORDER))
+            ):
+                self._recheck = True
+            return
+
+        margin_x, margin_y = self._margin * width, self._margin * height
+        found = (
+            int(max(detected_cards[:, XMIN].min() - margin_x, 0)),
+            int(max(detected_cards[:, YMIN].min() - margin_y, 0)),
+            int(min(detected_cards[:, XMAX].max() + margin_x, width)),
+            int(min(detected_cards[:, YMAX].max() + margin_y, height)),
+        )
+        if self._region is not None:
+            found = (
+                min(found[0], self._region[0]),
+                min(found[1], self._region[1]),
+                max(found[2], self._region[2]),
+                max(found[3], self._region[3]),
+            )
+
+        self._region = found
@@ -0,0 +1,122 @@
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+
+from config import scores, trumps
+from deck import CARD_NAMES, NO_CARDS, SUITS
+
+NO_PLAYERS = 3
+# Index padding the tricks with fewer cards, and the trump suit of the tricks
+# played without a trump
+NO_CARD = NO_CARDS
+NO_TRUMP = len(SUITS)
+
+# Per-card tables indexed by the deck index, the padding has no suit and no
+# points
+CARD_SUITS = np.array(
+    [SUITS.index(name[-1]) for name in CARD_NAMES] + [NO_TRUMP], dtype=np.int64
+)
+CARD_SCORES = np.array(
+    [scores[name[:-1]] for name in CARD_NAMES] + [0], dtype=np.int64
+)
+_VALUES = np.array([name[:-1] for name in CARD_NAMES] + [""])
+MARRIAGE_SCORES = np.array([trumps[suit] for suit in SUITS] + [0], dtype=np.int64)
+
+
+def _beats_table() -> np.ndarray:
+    pivot = np.arange(NO_CARD + 1)[:, None, None]
+    card = np.arange(NO_CARD + 1)[None, :, None]
+    trump = np.arange(NO_TRUMP + 1)[None, None, :]
+
+    same_suit = CARD_SUITS[card] == CARD_SUITS[pivot]
+    higher = CARD_SCORES[card] > CARD_SCORES[pivot]
+    trumped = ~same_suit & (CARD_SUITS[card] == trump)
+    valid = (pivot != NO_CARD) & (card != NO_CARD)
+
+    return valid & ((same_suit & higher) | trumped)
+
+
+def _marriage_table() -> np.ndarray:
+    previous = np.arange(NO_CARD + 1)[:, None]
+    card = np.arange(NO_CARD + 1)[None, :]
+
+    return (
+        (_VALUES[previous] == "Q")
+        & (_VALUES[card] == "K")
+        & (CARD_SUITS[previous] == CARD_SUITS[card])
+        & (card != NO_CARD)
+    )
+
+
+# BEATS[pivot, card, trump]: the card takes the trick from the pivot card
+BEATS = _beats_table()
+# MARRIAGE[previous, card]: the card is the king completing a marriage with
+# the queen played right before it
+MARRIAGE = _marriage_table()
+
+
+def trick_indices(tricks: Sequence[Sequence[str]]) -> np.ndarray:
+    """
+    :param tricks: Names of the cards of every trick in the order played.
+    :return: Array of shape (T, K) with the deck indices of the cards, padded
+        with NO_CARD.
+    """
+    size = max((len(trick) for trick in tricks), default=0)
+    indices = np.full((len(tricks), size), NO_CARD, dtype=np.int64)
+    for ind, trick in enumerate(tricks):
+        indices[ind, : len(trick)] = [CARD_NAMES.index(name) for name in trick]
+
+    return indices
+
+
+def trump_index(suit: Union[str, None]) -> int:
+    return NO_TRUMP if suit is None else SUITS.index(suit)
+
+
+def resolve_tricks(
+    tricks: np.ndarray,
+    trump: Union[int, np.ndarray] = NO_TRUMP,
+    no_players: int = NO_PLAYERS,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Resolves many tricks at once.
+
+    The first card leads, a card takes the trick with a higher card of the
+    suit of the card leading so far or with a trump. A king played right
+    after the queen of its suit in a trick with more cards than players
+    completes a marriage, the king only scores the marriage and takes no
+    part in the trick.
+
+    :param tricks: Array of shape (T, K) with the deck indices of the cards
+        in the order played, padded with NO_CARD, see trick_indices.
+    :param trump: Trump suit of every trick or of all of them, see
+        trump_index.
+    :return: Position of the winning card of every trick, points of the
+        cards won, mask of shape (T, K) of the marriage kings and points of
+        the marriages.
+    """
+    tricks = np.asarray(tricks, dtype=np.int64)
+    no_tricks, size = tricks.shape
+    trump = np.broadcast_to(np.asarray(trump, dtype=np.int64), (no_tricks,))
+
+    lengths = (tricks != NO_CARD).sum(axis=1)
+    kings = np.zeros(tricks.shape, dtype=bool)
+    if size > 1:
+        kings[:, 1:] = MARRIAGE[tricks[:, :-1], tricks[:, 1:]]
+        kings &= (lengths > no_players)[:, None]
+
+    winners = np.zeros(no_tricks, dtype=np.int64)
+    pivots = tricks[:, 0].copy() if size > 0 else np.full(no_tricks, NO_CARD)
+    for position in range(1, size):
+        cards = tricks[:, position]
+        beats = BEATS[pivots, cards, trump] & ~kings[:, position]
+        pivots = np.where(beats, cards, pivots)
+        winners[beats] = position
+
+    counted = (tricks != NO_CARD) & ~kings
+    points = np.where(counted, CARD_SCORES[tricks], 0).sum(axis=1)
+    marriage_points = np.where(
+        kings, MARRIAGE_SCORES[CARD_SUITS[tricks]], 0
+    ).sum(axis=1)
+
+    return winners, points, kings, marriage_points
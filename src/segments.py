@@ -0,0 +1,204 @@
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+import cv2
+
+from cache import DetectionReader, DetectionWriter, cache_path
+from events import Listener
+from frames import FrameReader, sampling_stride
+from game import Game, THRESHOLD
+from player import Player
+from votes import MIN_CONFIDENCE
+from window import GameWindow, MERGE_FRAMES
+
+# Per-process state of the pool workers, the detector is loaded only once
+# for all segments processed by the worker
+_worker: Dict[str, Any] = {}
+
+
+def split_video(no_frames: int, no_segments: int) -> List[Tuple[int, int]]:
+    """
+    :return: Consecutive (start, end) frame ranges covering the whole video.
+    """
+    no_segments = max(1, min(no_segments, no_frames))
+    bounds = [no_frames * ind // no_segments for ind in range(no_segments + 1)]
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _init_worker(weights_path: Path, options: Dict[str, Any]) -> None:
+    from detector import Detector
+
+    _worker["options"] = options
+    _worker["detector"] = Detector(
+        weights_path, options["backend"], options["repo"], options["threads"]
+    )
+
+
+def _detect_segment(task: Tuple[Path, int, int, int, Path]) -> Path:
+    """
+    Decodes the sampled frames of a segment and stores their detections.
+
+    :param task: Video, first frame, end frame (exclusive), sampling stride
+        and the directory to write the detections to.
+    :return: Directory with the detections of the segment.
+    """
+    source_path, start, end, stride, out_path = task
+    detector = _worker["detector"]
+    batch_size = max(_worker["options"]["batch_size"], 1)
+
+    cap = cv2.VideoCapture(str(source_path))
+    if not cap.isOpened():
+        raise RuntimeError("Could not open video")
+
+    # The sampled frames are the same as if the whole video was read at once
+    start = -(-start // stride) * stride
+
+    # FFmpeg seeks to the preceding keyframe and decodes up to the frame
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != start:
+        # Some codecs only seek near the frame, the frames before the segment
+        # are grabbed from the start of the video instead
+        cap.release()
+        cap = cv2.VideoCapture(str(source_path))
+        for _ in range(start):
+            if not cap.grab():
+                raise RuntimeError("Could not seek the video to the segment")
+
+    reader = FrameReader(cap, batch_size, stride)
+    with DetectionWriter(out_path, detector.get_names()) as writer:
+        frames = []
+        for _ in range(start, end, stride):
+            frame = reader.read()
+            if frame is None:
+                break
+
+            frames.append(frame)
+            if len(frames) == batch_size:
+                for detected_cards in detector.detect_cards_batch(frames):
+                    writer.write(detected_cards)
+                frames = []
+
+        for detected_cards in detector.detect_cards_batch(frames):
+            writer.write(detected_cards)
+
+    cap.release()
+    return out_path
+
+
+def run_segments(
+    source_path: Path,
+    weights_path: Path,
+    verbose: str,
+    workers: int,
+    options: Dict[str, Any],
+    cache_dir: Union[Path, None] = None,
+    merge_frames: int = MERGE_FRAMES,
+    threshold: int = THRESHOLD,
+    min_confidence: float = MIN_CONFIDENCE,
+    listeners: Sequence[Listener] = (),
+) -> Union[Player, None]:
+    """
+    Splits the video into frame ranges detected in parallel by a pool of
+    worker processes. The detections are fed to the game in frame order as
+    soon as the segments preceding them are done, as the game itself has to
+    run sequentially.
+
+    :param options: Detector options of the workers, the backend, repo,
+        threads, batch_size, sample_every and target_fps. With threads 0 the
+        cores are split evenly between the workers.
+    :param listeners: Subscribed to the events of the game, see events.
+    :return: The winner of the game or None if it has not been determined.
+    """
+    cap = cv2.VideoCapture(str(source_path))
+    if not cap.isOpened():
+        raise RuntimeError("Could not open video")
+
+    no_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    stride = sampling_stride(
+        cap.get(cv2.CAP_PROP_FPS), options["sample_every"], options["target_fps"]
+    )
+    cap.release()
+    if no_frames <= 0:
+        raise RuntimeError("Could not determine the number of frames of the video")
+
+    # By default every worker would run inference on all the cores
+    if options["threads"] == 0:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        options = {**options, "threads": threads}
+
+    winner = None
+    window = None
+    cache_writer = None
+    completed = False
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir, context.Pool(
+        workers, initializer=_init_worker, initargs=(weights_path, options)
+    ) as pool:
+        tasks = [
+            (source_path, start, end, stride, Path(tmp_dir) / f"segment_{ind}")
+            for ind, (start, end) in enumerate(split_video(no_frames, workers))
+        ]
+
+        frame_index = 0
+        try:
+            # imap yields the segments in order, while the later ones are
+            # still being detected
+            for segment_path in pool.imap(_detect_segment, tasks):
+                reader = DetectionReader(segment_path)
+                if window is None:
+                    game = Game(verbose, threshold)
+                    for listener in listeners:
+                        game.subscribe(listener)
+                    window = GameWindow(
+                        game, reader.get_names(), merge_frames, min_confidence
+                    )
+                    if cache_dir is not None:
+                        cache_writer = DetectionWriter(
+                            cache_path(
+                                cache_dir, source_path, weights_path, stride
+                            ),
+                            reader.get_names(),
+                        )
+
+                for detected_cards in reader:
+                    if cache_writer is not None:
+                        cache_writer.write(detected_cards)
+                    if winner is not None:
+                        # The rest of the video is only read to complete the
+                        # cache
+                        continue
+
+                    try:
+                        winner = window.push(detected_cards, frame_index * stride)
+                    except Exception as e:
+                        print(e)
+                        print("Terminating due to error")
+                        sys.exit(-1)
+
+                    frame_index += 1
+                    if winner is not None and cache_writer is None:
+                        break
+
+                del reader
+                shutil.rmtree(segment_path)
+                if winner is not None and cache_writer is None:
+                    break
+            else:
+                completed = True
+        finally:
+            if cache_writer is not None:
+                # Runs stopped before the end of the video leave no usable cache
+                cache_writer.close(complete=completed)
+
+    if winner is not None:
+        print(f"Player {winner.get_id()} won the game of Russian Schnapsen!")
+    else:
+        print("Winner has not been determined")
+
+    return winner
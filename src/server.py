@@ -0,0 +1,329 @@
+import mmap
+import os
+import queue
+import threading
+import time
+from argparse import ArgumentParser
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from config import BACKENDS, REPO, SOCKET
+
+# Frames detected in a single forward pass at most
+MAX_BATCH = 16
+# Seconds a request waits for requests of other streams to join its batch
+MAX_WAIT = 0.005
+# Where the POSIX shared memory segments of the clients are
+SHM_DIR = "/dev/shm"
+
+
+def _attach(name: str) -> mmap.mmap:
+    """
+    Maps a segment created by a client read-only. The segment is owned by
+    the client, it is not attached as a SharedMemory, whose resource
+    tracker would unlink it when the server exits.
+    """
+    with open(os.path.join(SHM_DIR, name), "rb") as infile:
+        return mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _frame_views(buffer: Any, shapes: Sequence[Tuple[int, ...]]) -> List[np.ndarray]:
+    frames, offset = [], 0
+    for shape in shapes:
+        frame = np.ndarray(shape, dtype=np.uint8, buffer=buffer, offset=offset)
+        frames.append(frame)
+        offset += frame.nbytes
+
+    return frames
+
+
+class _Request:
+    def __init__(self, frames: List[np.ndarray]) -> None:
+        self.frames: Union[List[np.ndarray], None] = frames
+        self.detections: List[np.ndarray] = []
+        self.error: Union[str, None] = None
+        self.done = threading.Event()
+
+
+class DetectionServer:
+    """
+    Serves the detections of a single model to many controllers.
+
+    Every client connects to a local socket and passes its frames through
+    a shared memory segment, only the shapes and the detections go through
+    the socket. Requests arriving within max_wait of each other are detected
+    in a single batch, up to max_batch frames.
+    """
+
+    def __init__(
+        self,
+        detector: Any,
+        address: str = SOCKET,
+        max_batch: int = MAX_BATCH,
+        max_wait: float = MAX_WAIT,
+    ) -> None:
+        self._detector = detector
+        self._address: str = address
+        self._max_batch: int = max_batch
+        self._max_wait: float = max_wait
+        self._requests: "queue.Queue[_Request]" = queue.Queue()
+
+        self._no_batches: int = 0
+        self._no_frames: int = 0
+
+    def get_no_batches(self) -> int:
+        return self._no_batches
+
+    def get_no_frames(self) -> int:
+        return self._no_frames
+
+    def serve_forever(self) -> None:
+        # A socket left behind by a server that did not exit cleanly
+        if os.path.exists(self._address):
+            os.unlink(self._address)
+
+        with Listener(self._address, family="AF_UNIX") as listener:
+            # Only the user running the server can connect
+            os.chmod(self._address, 0o600)
+            threading.Thread(target=self._detect_batches, daemon=True).start()
+
+            while True:
+                conn = listener.accept()
+                threading.Thread(
+                    target=self._serve_client, args=(conn,), daemon=True
+                ).start()
+
+    def _serve_client(self, conn: Connection) -> None:
+        conn.send(
+            {
+                "names": self._detector.get_names(),
+                "img_size": self._detector.get_img_size(),
+            }
+        )
+
+        segment: Union[mmap.mmap, None] = None
+        segment_name = None
+        try:
+            while True:
+                try:
+                    name, shapes = conn.recv()
+                except EOFError:
+                    break
+
+                # The client creates a new segment when the frames outgrow it
+                if name != segment_name:
+                    if segment is not None:
+                        segment.close()
+                    segment, segment_name = _attach(name), name
+
+                request = _Request(_frame_views(segment, shapes))
+                self._requests.put(request)
+                request.done.wait()
+
+                if request.error is not None:
+                    conn.send(request.error)
+                else:
+                    conn.send(request.detections)
+        finally:
+            conn.close()
+            if segment is not None:
+                segment.close()
+
+    def _next_batch(self) -> List[_Request]:
+        batch = [self._requests.get()]
+        no_frames = len(batch[0].frames)
+        deadline = time.perf_counter() + self._max_wait
+
+        while no_frames < self._max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+
+            batch.append(request)
+            no_frames += len(request.frames)
+
+        return batch
+
+    def _detect_batches(self) -> None:
+        while True:
+            batch = self._next_batch()
+            frames = [frame for request in batch for frame in request.frames]
+
+            try:
+                detections = self._detector.detect_cards_batch(frames)
+            except Exception as e:
+                for request in batch:
+                    request.error = repr(e)
+            else:
+                offset = 0
+                for request in batch:
+                    end = offset + len(request.frames)
+                    request.detections = detections[offset:end]
+                    offset = end
+
+            self._no_batches += 1
+            self._no_frames += len(frames)
+            for request in batch:
+                # The views have to be gone before the segment is closed
+                request.frames = None
+                request.done.set()
+
+
+class RemoteDetector:
+    """
+    Detector running in a DetectionServer, usable in place of Detector.
+    """
+
+    def __init__(self, address: str = SOCKET) -> None:
+        self._conn = Client(address, family="AF_UNIX")
+        handshake: Dict[str, Any] = self._conn.recv()
+        self._names: List[str] = handshake["names"]
+        self._img_size: int = handshake["img_size"]
+        self._shm: Union[SharedMemory, None] = None
+
+    def get_names(self) -> List[str]:
+        return self._names
+
+    def get_img_size(self) -> int:
+        return self._img_size
+
+    def get_img_sizes(self) -> List[int]:
+        # The input size is shared by all clients of the server
+        return [self._img_size]
+
+    def set_img_size(self, img_size: int) -> None:
+        if img_size != self._img_size:
+            raise ValueError(f"Unsupported input size: {img_size}")
+
+    def detect_cards(self, frame: np.ndarray) -> np.ndarray:
+        return self.detect_cards_batch([frame])[0]
+
+    def detect_cards_batch(self, frames: List[np.ndarray]) -> List[np.ndarray]:
+        if len(frames) == 0:
+            return []
+
+        size = sum(frame.nbytes for frame in frames)
+        if self._shm is None or self._shm.size < size:
+            self._release()
+            self._shm = SharedMemory(create=True, size=size)
+
+        buffer, offset = self._shm.buf, 0
+        for frame in frames:
+            view = np.ndarray(frame.shape, np.uint8, buffer=buffer, offset=offset)
+            view[...] = frame
+            offset += frame.nbytes
+        # No view may outlive the segment once it is released
+        del view, buffer
+
+        self._conn.send((self._shm.name, [frame.shape for frame in frames]))
+        reply = self._conn.recv()
+        if isinstance(reply, str):
+            raise RuntimeError(f"Detection server failed: {reply}")
+
+        return reply
+
+    def _release(self) -> None:
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def close(self) -> None:
+        self._conn.close()
+        self._release()
+
+
+def parse_cores(cores: str) -> List[int]:
+    """
+    :param cores: Comma separated cores or ranges of cores, e.g. 0-3,8.
+    """
+    parsed = []
+    for part in cores.split(","):
+        first, _, last = part.partition("-")
+        parsed += list(range(int(first), int(last or first) + 1))
+
+    return parsed
+
+
+def create_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        description="Serves card detections of a single model to many streams."
+    )
+
+    parser.add_argument(
+        "-w", "--weights", required=True, help="Path to yolo pre-trained weights",
+    )
+    parser.add_argument(
+        "--socket", default=SOCKET, help="Path of the socket to listen on.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=None,
+        help="Inference backend, picked by the weights file suffix by default.",
+    )
+    parser.add_argument(
+        "--repo",
+        default=REPO,
+        help="YOLOv5 hub repository or path to its local checkout (torch backend).",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="Number of inference threads, one per pinned core by default.",
+    )
+    parser.add_argument(
+        "--cores",
+        type=str,
+        default=None,
+        help="Cores to pin the server to, e.g. 0-7 or 0,2,4,6.",
+    )
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=MAX_BATCH,
+        help="Maximum number of frames detected in a single forward pass.",
+    )
+    parser.add_argument(
+        "--max-wait",
+        type=float,
+        default=MAX_WAIT,
+        help="Seconds a request waits for requests of other streams.",
+    )
+
+    return parser
+
+
+if __name__ == "__main__":
+    parser = create_parser()
+    args = parser.parse_args()
+
+    weights_path = Path(args.weights).resolve()
+    if not weights_path.exists():
+        raise FileNotFoundError("Weigths path invalid, file not found")
+
+    if args.max_batch < 1:
+        raise ValueError("Maximum batch size has to be a positive number")
+
+    threads = args.threads
+    if args.cores is not None:
+        cores = parse_cores(args.cores)
+        os.sched_setaffinity(0, cores)
+        if threads == 0:
+            threads = len(cores)
+
+    from detector import Detector
+
+    detector = Detector(weights_path, args.backend, args.repo, threads)
+    server = DetectionServer(detector, args.socket, args.max_batch, args.max_wait)
+    print(f"Serving {weights_path.name} on {args.socket}")
+    server.serve_forever()
@@ -0,0 +1,203 @@
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+from config import DETECT_EVERY
+from detections import CLASS, CONFIDENCE, DETECTION_COLUMNS, XMIN, YMAX
+
+IOU_THRESHOLD = 0.3
+# Frames a track is kept without a matching detection, long enough to
+# bridge a single missed detection
+MAX_AGE = 2 * DETECT_EVERY
+# Detections a track needs before it is reported on the frames in between
+MIN_HITS = 2
+# Weight of the previous velocity of a track, the rest is the new estimate
+VELOCITY_SMOOTHING = 0.5
+
+
+def iou_matrix(boxes: np.ndarray, other: np.ndarray) -> np.ndarray:
+    """
+    :return: Array of shape (N, M) with the IoU of every pair of xyxy boxes.
+    """
+    xmin = np.maximum(boxes[:, None, 0], other[None, :, 0])
+    ymin = np.maximum(boxes[:, None, 1], other[None, :, 1])
+    xmax = np.minimum(boxes[:, None, 2], other[None, :, 2])
+    ymax = np.minimum(boxes[:, None, 3], other[None, :, 3])
+    inter = np.clip(xmax - xmin, 0, None) * np.clip(ymax - ymin, 0, None)
+
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    other_areas = (other[:, 2] - other[:, 0]) * (other[:, 3] - other[:, 1])
+    union = areas[:, None] + other_areas[None, :] - inter
+
+    return inter / np.maximum(union, 1e-6)
+
+
+class CardTracker:
+    """
+    Follows the detected cards between frames, so that the detector runs
+    only on every detect_every-th frame.
+
+    Detections are associated with the tracks of the same card by IoU, the
+    boxes of the tracks are moved with a constant velocity on the frames in
+    between. A track survives up to max_age frames without a detection,
+    bridging single missed detections. Tracks seen fewer than min_hits times
+    are reported only on the frames they were detected in, so a one-off
+    false detection counts no more than without tracking.
+
+    The state is kept in columns, one row per track.
+    """
+
+    def __init__(
+        self,
+        detect_every: int = DETECT_EVERY,
+        iou_threshold: float = IOU_THRESHOLD,
+        max_age: int = MAX_AGE,
+        min_hits: int = MIN_HITS,
+    ) -> None:
+        self._detect_every: int = detect_every
+        self._iou_threshold: float = iou_threshold
+        self._max_age: int = max_age
+        self._min_hits: int = min_hits
+        self.reset()
+
+    def reset(self) -> None:
+        self._ids: np.ndarray = np.empty(0, dtype=np.int64)
+        self._class_ids: np.ndarray = np.empty(0, dtype=np.int64)
+        self._confidences: np.ndarray = np.empty(0, dtype=np.float32)
+        self._boxes: np.ndarray = np.empty((0, 4), dtype=np.float32)
+        self._velocities: np.ndarray = np.empty((0, 4), dtype=np.float32)
+        self._ages: np.ndarray = np.empty(0, dtype=np.int64)
+        self._hits: np.ndarray = np.empty(0, dtype=np.int64)
+        self._misses: np.ndarray = np.empty(0, dtype=np.int64)
+
+        self._next_id: int = 0
+        self._no_scheduled: int = 0
+        self._reported: np.ndarray = np.empty(0, dtype=np.int64)
+
+    def schedule(self, no_frames: int) -> List[bool]:
+        """
+        :return: For each of the next frames, whether it has to be detected.
+        """
+        scheduled = [
+            (self._no_scheduled + ind) % self._detect_every == 0
+            for ind in range(no_frames)
+        ]
+        self._no_scheduled += no_frames
+
+        return scheduled
+
+    def step(self, detected_cards: Union[np.ndarray, None] = None) -> np.ndarray:
+        """
+        Moves the tracks to the next frame and updates them with its
+        detections, if the frame was detected.
+
+        :param detected_cards: Detections of the frame, see
+            Detector.detect_cards, or None if it was not detected.
+        :return: Detections of the tracked cards in the frame.
+        """
+        self._boxes += self._velocities
+        self._ages += 1
+        self._misses += 1
+
+        if detected_cards is not None:
+            self._associate(detected_cards)
+
+        alive = self._misses <= self._max_age
+        self._select(alive)
+
+        # Tentative tracks only count in the frames they were detected in
+        reported = (self._hits >= self._min_hits) | (self._misses == 0)
+        self._reported = np.flatnonzero(reported)
+
+        tracked = np.empty((len(self._reported), DETECTION_COLUMNS), np.float32)
+        tracked[:, XMIN : YMAX + 1] = self._boxes[self._reported]
+        tracked[:, CONFIDENCE] = self._confidences[self._reported]
+        tracked[:, CLASS] = self._class_ids[self._reported]
+
+        return tracked
+
+    def _associate(self, detected_cards: np.ndarray) -> None:
+        boxes = detected_cards[:, XMIN : YMAX + 1]
+        class_ids = detected_cards[:, CLASS].astype(np.int64)
+
+        iou = iou_matrix(self._boxes, boxes)
+        # Only detections of the same card continue a track
+        iou[self._class_ids[:, None] != class_ids[None, :]] = 0.0
+
+        matched = np.zeros(len(detected_cards), dtype=bool)
+        while iou.size > 0:
+            track, det = np.unravel_index(iou.argmax(), iou.shape)
+            if iou[track, det] < self._iou_threshold:
+                break
+
+            iou[track, :] = 0.0
+            iou[:, det] = 0.0
+            matched[det] = True
+
+            # The box has been moved by the velocity since the last detection
+            frames = self._misses[track]
+            previous = self._boxes[track] - frames * self._velocities[track]
+            velocity = (boxes[det] - previous) / frames
+            self._velocities[track] = (
+                VELOCITY_SMOOTHING * self._velocities[track]
+                + (1 - VELOCITY_SMOOTHING) * velocity
+            )
+            self._boxes[track] = boxes[det]
+            self._confidences[track] = detected_cards[det, CONFIDENCE]
+            self._hits[track] += 1
+            self._misses[track] = 0
+
+        new = np.flatnonzero(~matched)
+        no_new = len(new)
+        self._ids = np.concatenate(
+            [self._ids, np.arange(self._next_id, self._next_id + no_new)]
+        )
+        self._next_id += no_new
+        self._class_ids = np.concatenate([self._class_ids, class_ids[new]])
+        self._confidences = np.concatenate(
+            [self._confidences, detected_cards[new, CONFIDENCE]]
+        )
+        self._boxes = np.concatenate([self._boxes, boxes[new]])
+        self._velocities = np.concatenate(
+            [self._velocities, np.zeros((no_new, 4), dtype=np.float32)]
+        )
+        self._ages = np.concatenate([self._ages, np.zeros(no_new, dtype=np.int64)])
+        self._hits = np.concatenate([self._hits, np.ones(no_new, dtype=np.int64)])
+        self._misses = np.concatenate([self._misses, np.zeros(no_new, dtype=np.int64)])
+
+    def _select(self, mask: np.ndarray) -> None:
+        self._ids = self._ids[mask]
+        self._class_ids = self._class_ids[mask]
+        self._confidences = self._confidences[mask]
+        self._boxes = self._boxes[mask]
+        self._velocities = self._velocities[mask]
+        self._ages = self._ages[mask]
+        self._hits = self._hits[mask]
+        self._misses = self._misses[mask]
+
+    def get_track_ids(self) -> np.ndarray:
+        """
+        :return: Track ids of the rows returned by the last step.
+        """
+        return self._ids[self._reported]
+
+    def get_ages(self) -> np.ndarray:
+        """
+        :return: Number of frames the tracks of the rows returned by the last
+            step have existed for.
+        """
+        return self._ages[self._reported]
+
+    def get_settings(self) -> Dict[str, Any]:
+        """
+        :return: Options changing the detections of a run, see cache_key.
+        """
+        return {
+            "detect_every": self._detect_every,
+            "iou_threshold": self._iou_threshold,
+            "max_age": self._max_age,
+            "min_hits": self._min_hits,
+        }
+
+    def get_no_tracks(self) -> int:
+        return len(self._ids)
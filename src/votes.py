@@ -0,0 +1,68 @@
+from typing import Sequence, Set, Union
+
+import numpy as np
+
+from config import MIN_CONFIDENCE
+from deck import deck_bits
+
+
+class CardVotes:
+    """
+    Per-class hit counters of a window of frames.
+
+    The counters are updated as the detections of every frame arrive, so
+    deciding which card entered the table at the end of a window only
+    looks at a fixed number of classes instead of all the detections.
+    """
+
+    def __init__(
+        self, names: Sequence[str], min_confidence: float = MIN_CONFIDENCE
+    ) -> None:
+        self._names: np.ndarray = np.asarray(names)
+        # Bit of every class in the card bitmasks of the game
+        self._bits: np.ndarray = deck_bits(names)
+        self._min_confidence: float = min_confidence
+
+        self._hits: np.ndarray = np.zeros(len(names), dtype=np.int64)
+        self._seen: np.ndarray = np.zeros(len(names), dtype=np.int64)
+
+    def update(self, class_ids: np.ndarray, confidences: np.ndarray) -> None:
+        """
+        Counts the detections of a single frame.
+
+        :param class_ids: Class ids of the detected cards.
+        :param confidences: Confidences of the detected cards.
+        """
+        np.add.at(self._seen, class_ids, 1)
+        np.add.at(self._hits, class_ids[confidences > self._min_confidence], 1)
+
+    def reset(self) -> None:
+        self._hits[:] = 0
+        self._seen[:] = 0
+
+    def get_hits(self) -> np.ndarray:
+        return self._hits
+
+    def get_detected(self) -> Set[str]:
+        """
+        :return: Names of all cards detected in the window regardless
+            of their confidence.
+        """
+        return set(self._names[self._seen > 0].tolist())
+
+    def get_entering(self, excluded: int, threshold: int) -> Union[str, None]:
+        """
+        Finds the card with the most confident hits in the window.
+
+        :param excluded: Bitmask of the cards that cannot be entering the
+            table, see deck.
+        :param threshold: Number of hits a card needs to exceed.
+        :return: Name of the entering card or None if there is no such card.
+        """
+        hits = np.where(self._bits & excluded, 0, self._hits)
+
+        ind = hits.argmax()
+        if hits[ind] > threshold:
+            return str(self._names[ind])
+
+        return None
@@ -0,0 +1,73 @@
+from typing import Sequence, Union
+
+import numpy as np
+
+from config import MERGE_FRAMES
+from detections import DETECTIONS_PER_FRAME, DetectionBuffer
+from game import Game
+from player import Player
+from votes import MIN_CONFIDENCE
+
+
+class GameWindow:
+    """
+    Collects the detections of consecutive frames and passes them to the game
+    once every merge_frames frames.
+
+    Only the frames pushed are counted, if the video is sampled both the
+    window and the vote threshold of the game are in sampled frames.
+    """
+
+    def __init__(
+        self,
+        game: Game,
+        names: Sequence[str],
+        merge_frames: int = MERGE_FRAMES,
+        min_confidence: float = MIN_CONFIDENCE,
+    ) -> None:
+        self.game: Game = game
+        self._merge_frames: int = merge_frames
+        self._frame_counter: int = 0
+        self._no_windows: int = 0
+        self._buffer = DetectionBuffer(
+            names, merge_frames * DETECTIONS_PER_FRAME, min_confidence
+        )
+
+    def push(self, detected_cards: np.ndarray, frame_index: int) -> Union[Player, None]:
+        """
+        Adds the detections of a single frame, closing the window if full.
+
+        :param detected_cards: Detections of the frame, see Detector.detect_cards.
+        :param frame_index: Index of the frame in the video, counting the
+            frames skipped by the sampling.
+        :return: The winner of the game once the game has ended, None otherwise.
+        """
+        self._frame_counter += 1
+        self._buffer.append(detected_cards, frame_index)
+
+        if self._frame_counter < self._merge_frames:
+            return None
+
+        winner = self.game.game_frame(self._buffer)
+        self._no_windows += 1
+        self._frame_counter = 0
+        self._buffer.clear()
+
+        return winner
+
+    def reset(self) -> None:
+        self._frame_counter = 0
+        self._no_windows = 0
+        self._buffer.clear()
+
+    def get_names(self) -> np.ndarray:
+        return self._buffer.get_names()
+
+    def get_no_windows(self) -> int:
+        """
+        :return: Number of windows passed to the game so far.
+        """
+        return self._no_windows
+
+    def get_merge_frames(self) -> int:
+        return self._merge_frames
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules of the tool are imported as top-level names, as in src/main.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
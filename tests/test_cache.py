@@ -0,0 +1,93 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from cache import DetectionReader, DetectionWriter, cache_key, detection_settings
+from controller import Controller
+from motion import MotionGate
+from tracker import CardTracker
+
+NAMES = ["9H", "10H"]
+CARDS = np.array([[10, 10, 30, 40, 0.9, 1]], dtype=np.float32)
+
+
+def test_complete_cache_is_read(tmp_path):
+    with DetectionWriter(tmp_path, NAMES) as writer:
+        writer.write(CARDS)
+        writer.write(CARDS[:0])
+
+    reader = DetectionReader(tmp_path)
+    assert len(reader) == 2
+    np.testing.assert_array_equal(reader[0], CARDS)
+    assert len(reader[1]) == 0
+
+
+def test_incomplete_cache_is_not_read(tmp_path):
+    writer = DetectionWriter(tmp_path, NAMES)
+    writer.write(CARDS)
+    writer.close(complete=False)
+
+    assert not DetectionReader.exists(tmp_path)
+    with pytest.raises(FileNotFoundError):
+        DetectionReader(tmp_path)
+
+
+class StaticDetector:
+    def get_names(self):
+        return NAMES
+
+    def detect_cards(self, frame: np.ndarray) -> np.ndarray:
+        return CARDS.copy()
+
+
+def test_cache_covers_the_video_after_the_winner(tmp_path):
+    source_path, weights_path = tmp_path / "video.avi", tmp_path / "weights.pt"
+    weights_path.write_bytes(b"weights")
+    no_frames = 40
+    writer = cv2.VideoWriter(
+        str(source_path), cv2.VideoWriter_fourcc(*"MJPG"), 30, (32, 32)
+    )
+    for _ in range(no_frames):
+        writer.write(np.zeros((32, 32, 3), dtype=np.uint8))
+    writer.release()
+
+    controller = Controller(
+        source_path,
+        weights_path,
+        "silent",
+        no_show=True,
+        detector=StaticDetector(),
+        cache_dir=tmp_path / "cache",
+        merge_frames=10,
+    )
+    # The game ends with the first window
+    controller.game.game_frame = lambda detected_cards: controller.game.players[0]
+
+    assert controller.run() is controller.game.players[0]
+    assert controller.get_no_frames() == 10
+
+    (key,) = os.listdir(tmp_path / "cache")
+    reader = DetectionReader(tmp_path / "cache" / key)
+    assert len(reader) == no_frames
+
+
+def test_key_depends_on_detection_settings(tmp_path):
+    source_path, weights_path = tmp_path / "video.avi", tmp_path / "weights.pt"
+    source_path.write_bytes(b"video")
+    weights_path.write_bytes(b"weights")
+
+    keys = {
+        cache_key(source_path, weights_path, 1, detection_settings(*stages))
+        for stages in [
+            (None, None, None),
+            (MotionGate(2.0), None, None),
+            (MotionGate(4.0), None, None),
+            (None, None, CardTracker(3)),
+        ]
+    }
+    assert len(keys) == 4
+    assert cache_key(source_path, weights_path) == cache_key(
+        source_path, weights_path, 1, detection_settings(None, None, None)
+    )
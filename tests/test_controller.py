@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from controller import Controller
+from motion import MotionGate
+from tracker import CardTracker
+
+NAMES = ["9H", "10H", "JH"]
+# The same two cards lie on the table in every frame
+CARDS = np.array(
+    [[10, 10, 30, 40, 0.9, 0], [50, 10, 70, 40, 0.8, 2]], dtype=np.float32
+)
+
+
+class StaticDetector:
+    def __init__(self) -> None:
+        self.no_calls = 0
+
+    def get_names(self):
+        return NAMES
+
+    def detect_cards(self, frame: np.ndarray) -> np.ndarray:
+        self.no_calls += 1
+        return CARDS.copy()
+
+
+def test_static_frames_keep_tracked_cards():
+    detector = StaticDetector()
+    controller = Controller(
+        "video.avi",
+        "weights.pt",
+        "silent",
+        no_show=True,
+        detector=detector,
+        motion_gate=MotionGate(),
+        tracker=CardTracker(detect_every=3, max_age=6),
+    )
+
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    detected = []
+    for _ in range(70):
+        batch = controller._detect([frame.copy() for _ in range(10)])
+        detected.extend(cards for _, cards in batch)
+
+    # Only the first frame moves, the cards stay reported on all the others
+    assert detector.no_calls == 1
+    assert all(len(cards) == len(CARDS) for cards in detected)
+    np.testing.assert_allclose(detected[-1][:, :4], CARDS[:, :4])
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"pipelined": True},
+        {"live": True},
+        {"sample_every": 2},
+        {"target_fps": 10.0},
+        {"cache_dir": "cache"},
+    ],
+)
+def test_frame_budget_rejects_fixed_settings(options):
+    with pytest.raises(ValueError):
+        Controller(
+            "video.avi",
+            "weights.pt",
+            "silent",
+            no_show=True,
+            detector=StaticDetector(),
+            frame_budget=0.05,
+            **options,
+        )
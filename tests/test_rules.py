@@ -0,0 +1,52 @@
+import numpy as np
+
+from rules import NO_TRUMP, resolve_tricks, trick_indices, trump_index
+
+
+def resolve(cards, trump=None):
+    winners, points, kings, marriage_points = resolve_tricks(
+        trick_indices([cards]), trump_index(trump)
+    )
+    return winners[0], points[0], list(kings[0]), marriage_points[0]
+
+
+def test_highest_card_of_the_leading_suit_wins():
+    assert resolve(["10H", "AH", "9H"]) == (1, 21, [False] * 3, 0)
+    # Cards of other suits never take the trick without a trump
+    assert resolve(["9H", "AS", "JH"]) == (2, 13, [False] * 3, 0)
+
+
+def test_trump_takes_the_trick():
+    assert resolve(["AH", "9S", "10H"], "S") == (1, 21, [False] * 3, 0)
+    assert resolve(["AH", "9S", "JS"], "S") == (2, 13, [False] * 3, 0)
+    # A trump leading the trick is followed like any other suit
+    assert resolve(["QS", "AH", "KS"], "S") == (2, 18, [False] * 3, 0)
+
+
+def test_marriage_king_only_scores_the_marriage():
+    winner, points, kings, marriage_points = resolve(["QD", "KD", "9H", "AD"])
+    assert (winner, points, marriage_points) == (3, 14, 80)
+    assert kings == [False, True, False, False]
+
+    # Without the extra card a queen followed by its king is an ordinary trick
+    assert resolve(["QD", "KD", "9H"]) == (1, 7, [False] * 3, 0)
+
+
+def test_both_marriages_of_a_trick_are_scored():
+    winner, points, kings, marriage_points = resolve(["QH", "KH", "QS", "KS", "9C"])
+    assert (winner, points, marriage_points) == (0, 6, 140)
+    assert kings == [False, True, False, True, False]
+
+
+def test_tricks_are_resolved_together():
+    tricks = [["10H", "AH", "9H"], ["AH", "9S", "JS"], ["QD", "KD", "9H", "AD"]]
+    trumps = np.array([NO_TRUMP, trump_index("S"), NO_TRUMP])
+
+    winners, points, kings, marriage_points = resolve_tricks(
+        trick_indices(tricks), trumps
+    )
+
+    np.testing.assert_array_equal(winners, [1, 2, 3])
+    np.testing.assert_array_equal(points, [21, 13, 14])
+    np.testing.assert_array_equal(marriage_points, [0, 0, 80])
+    assert kings.sum() == 1